@@ -1,26 +1,153 @@
 '''It is main utility to work as interface.
 files to be checked must be named file1.txt and file3.txt.
-Even in they are source code name them as txt.'''
+Even in they are source code name them as txt.
 
-import re
+Usage:
+    python plagiarism.py file1.txt file2.txt
+        compare two files and print their similarity ratio. Files are
+        plagiarised if the ratio is above the threshold (0.66).
+
+    python plagiarism.py --batch DIR_OR_FILES... [--threshold 0.66]
+                         [--jobs N] [--format tsv|csv] [--pattern GLOB]
+        compare all pairs of files, loading each file once, and print a
+        table with the pairs whose ratio is above the threshold, as in the
+        two file mode.'''
+
+import argparse
+import csv
+import fnmatch
+import multiprocessing
+import os
 import sys
-from sys import argv
+from collections import Counter
+from difflib import SequenceMatcher
 
-script, first, second = argv
-'''
-it will match token and dictionary.
-file_1 = sys.argv[1]
-file_2 = sys.argv[2] '''
+THRESHOLD = 0.66
 
 
+def read_file(path):
+    with open(path, errors='replace') as F:
+        return F.read()
 
-from difflib import SequenceMatcher
-with open(first) as file_1,open(second) as file_2:
-    file1_data = file_1.read()
-    file2_data = file_2.read()
-    similarity_ratio = SequenceMatcher(None,file1_data,file2_data).ratio()
-    print(similarity_ratio)  #plagiarism detected
-if similarity_ratio>0.66:
-	print(" \nDocument Plagersed !!!\n")
-else :
-    print(" \n It is OK. Not Plagerised.")
+
+def compare_two(first, second, threshold=THRESHOLD):
+    '''
+    it will compare the two files as the original two file mode.
+    '''
+    file1_data = read_file(first)
+    file2_data = read_file(second)
+    similarity_ratio = SequenceMatcher(None, file1_data, file2_data).ratio()
+    print(similarity_ratio)  # plagiarism detected
+    if similarity_ratio > threshold:
+        print(" \nDocument Plagersed !!!\n")
+    else:
+        print(" \n It is OK. Not Plagerised.")
+
+
+def find_files(paths, pattern='*'):
+    '''list all files from the given files and directories'''
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if fnmatch.fnmatch(name, pattern):
+                        result.append(os.path.join(root, name))
+        else:
+            result.append(path)
+    return result
+
+
+def candidate_pairs(texts, threshold):
+    '''
+    pairs of indexes whose quick_ratio() upper bounds reach the threshold.
+
+    Character counts are computed once per file, so the bounds of each pair
+    cost only a Counter intersection.
+    '''
+    counts = [Counter(text) for text in texts]
+    sizes = [len(text) for text in texts]
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            total = sizes[i] + sizes[j]
+            if not total:
+                yield i, j
+                continue
+            # real_quick_ratio() bound
+            if 2.0 * min(sizes[i], sizes[j]) / total < threshold:
+                continue
+            # quick_ratio() bound
+            matches = sum((counts[i] & counts[j]).values())
+            if 2.0 * matches / total < threshold:
+                continue
+            yield i, j
+
+
+_TEXTS = None
+
+
+def _init_worker(texts):
+    global _TEXTS
+    _TEXTS = texts
+
+
+def _ratio(pair):
+    i, j = pair
+    return i, j, SequenceMatcher(None, _TEXTS[i], _TEXTS[j]).ratio()
+
+
+def compare_all(files, threshold=THRESHOLD, jobs=None):
+    '''
+    list (file1, file2, ratio) for all pairs with ratio > threshold,
+    sorted by decreasing ratio.
+    '''
+    texts = [read_file(path) for path in files]
+    pairs = list(candidate_pairs(texts, threshold))
+    if jobs == 1 or len(pairs) < 2:
+        _init_worker(texts)
+        results = list(map(_ratio, pairs))
+    else:
+        with multiprocessing.Pool(jobs, _init_worker, (texts,)) as pool:
+            results = pool.map(_ratio, pairs, chunksize=16)
+    results = [(files[i], files[j], ratio) for i, j, ratio in results
+               if ratio > threshold]
+    results.sort(key=lambda x: (-x[2], x[0], x[1]))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Compare files with difflib similarity ratios.')
+    parser.add_argument('files', nargs='+',
+                        help='two files, or files/directories with --batch')
+    parser.add_argument('--batch', action='store_true',
+                        help='compare all pairs of files')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='report ratios above this value '
+                             '(default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--format', choices=['tsv', 'csv'], default='tsv',
+                        help='output format in batch mode')
+    parser.add_argument('--pattern', default='*',
+                        help='glob for files inside directories')
+    opts = parser.parse_args(args)
+
+    if not opts.batch:
+        if len(opts.files) != 2:
+            parser.error('expected two files (or use --batch)')
+        compare_two(opts.files[0], opts.files[1], opts.threshold)
+        return
+
+    files = find_files(opts.files, opts.pattern)
+    results = compare_all(files, opts.threshold, opts.jobs)
+    delimiter = '\t' if opts.format == 'tsv' else ','
+    writer = csv.writer(sys.stdout, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(['file1', 'file2', 'ratio'])
+    for first, second, ratio in results:
+        writer.writerow([first, second, '%.6f' % ratio])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""
+Persistent archive of tokenized documents.
+
+An archive stores, for each document, its tokens, token counts, winnowing
+fingerprints and a hash of its content. New submissions can be checked
+against past ones without reading and tokenizing the archived files again.
+Corpus statistics such as document frequencies are computed by the caller
+from the archived tokens, so they always include the new submissions.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import zlib
+
+import numpy as np
+
+from plagiarism.loader import LazyDocument
+from plagiarism.tokenizers import tokenize_all, tokenizer_name
+from plagiarism.winnowing import fingerprints
+
+__all__ = ['Archive', 'ArchivedDocument', 'content_hash']
+
+MANIFEST = 'index.json'
+SEP = '\0'
+
+#: Version recorded in the manifest. Increment it whenever the file format or
+#: the output of a tokenizer changes without a change of its name. Archives
+#: with a different version are tokenized again from their stored texts.
+ARCHIVE_VERSION = 2
+
+
+def content_hash(text):
+    """
+    Return the hex SHA-256 digest of a string.
+    """
+
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+
+class Archive:
+    """
+    An on-disk index of tokenized documents.
+
+    Args:
+        path:
+            Directory used to store the archive. It is created if it does not
+            exist. An existing archive is loaded from it and, if it was
+            saved with a different ARCHIVE_VERSION, its documents are
+            tokenized again and the archive is saved.
+        tokenizer:
+            Tokenizer name or function used on all archived documents.
+        k, window:
+            Winnowing parameters used to compute fingerprints.
+    """
+
+    def __init__(self, path, tokenizer='code', k=5, window=4):
+        self.path = os.path.abspath(path)
+        self.tokenizer = tokenizer
+        self.documents = collections.OrderedDict()
+        self.k = k
+        self.window = window
+
+        manifest = os.path.join(self.path, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf8') as F:
+                data = json.load(F)
+            if data['tokenizer'] != tokenizer_name(tokenizer):
+                raise ValueError(
+                    'archive was created with the %r tokenizer'
+                    % data['tokenizer'])
+            self.k, self.window = data['k'], data['window']
+            self.documents.update(data['documents'])
+            if data.get('version', 1) != ARCHIVE_VERSION:
+                self._retokenize()
+                self.save()
+        else:
+            os.makedirs(self.path, exist_ok=True)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, name):
+        return name in self.documents
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    @property
+    def names(self):
+        """
+        List of archived document names.
+        """
+
+        return list(self.documents)
+
+    def save(self):
+        """
+        Write the archive manifest to disk.
+
+        Per document data is written when documents are added. Files of
+        removed or replaced documents are only deleted after the new manifest
+        is written, so the manifest on disk never refers to missing files.
+        """
+
+        data = {
+            'version': ARCHIVE_VERSION,
+            'tokenizer': tokenizer_name(self.tokenizer),
+            'k': self.k,
+            'window': self.window,
+            'documents': self.documents,
+        }
+        path = os.path.join(self.path, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf8') as F:
+            json.dump(data, F)
+        os.replace(path + '.tmp', path)
+
+        hashes = {info['hash'] for info in self.documents.values()}
+        for file in os.listdir(self.path):
+            digest, ext = os.path.splitext(file)
+            if ext == '.npz' and digest not in hashes:
+                os.remove(os.path.join(self.path, file))
+
+    def add(self, name, text, tokens=None):
+        """
+        Add or replace a document in the archive.
+
+        Args:
+            name:
+                Document name.
+            text:
+                Document content.
+            tokens:
+                Optional list of tokens, if the text was already tokenized.
+
+        Returns:
+            True if the archive changed and False if a document with the same
+            name and content was already present.
+        """
+
+        digest = content_hash(text)
+        if self.documents.get(name, {}).get('hash') == digest:
+            return False
+        if name in self.documents:
+            self.remove(name)
+        size = self._write(digest, text, tokens)
+        self.documents[name] = {'hash': digest, 'size': size}
+        return True
+
+    def _write(self, digest, text, tokens=None):
+        """
+        Write the file of a document and return its number of tokens.
+        """
+
+        if tokens is None:
+            tokens = tokenize_all([text], tokenizer=self.tokenizer)[0]
+        tokens = [str(tok) for tok in tokens]
+        counts = collections.Counter(tokens)
+        prints = [h for h, _ in fingerprints(tokens, self.k, self.window)]
+
+        np.savez_compressed(
+            self._file(digest),
+            tokens=_pack(tokens),
+            vocabulary=_pack(list(counts)),
+            counts=np.array(list(counts.values()), dtype=np.int32),
+            fingerprints=np.array(prints, dtype=np.uint64),
+            text=np.frombuffer(zlib.compress(text.encode('utf8')),
+                               dtype=np.uint8),
+        )
+        return len(tokens)
+
+    def _retokenize(self):
+        """
+        Tokenize all archived documents again from their stored texts.
+        """
+
+        for name, info in self.documents.items():
+            with np.load(self._file(info['hash'])) as data:
+                text = _load_text(data)
+            info['size'] = self._write(info['hash'], text)
+
+    def add_all(self, documents):
+        """
+        Add all documents from a mapping of names to texts.
+        """
+
+        for name, text in documents.items():
+            self.add(name, text)
+
+    def remove(self, name):
+        """
+        Remove document from archive.
+
+        Its file is deleted by the next call to save().
+        """
+
+        del self.documents[name]
+
+    def find(self, text):
+        """
+        Return the name of the first archived document with exactly the same
+        content as text, or None.
+        """
+
+        digest = content_hash(text)
+        for name, info in self.documents.items():
+            if info['hash'] == digest:
+                return name
+        return None
+
+    def tokens(self, name):
+        """
+        Return the list of tokens of an archived document.
+        """
+
+        return _unpack(self._load(name)['tokens'])
+
+    def counts(self, name):
+        """
+        Return a Counter with the token counts of an archived document.
+        """
+
+        return self._counts_from_hash(self.documents[name]['hash'])
+
+    def _counts_from_hash(self, digest):
+        data = np.load(self._file(digest))
+        vocabulary = _unpack(data['vocabulary'])
+        return collections.Counter(dict(zip(vocabulary,
+                                            data['counts'].tolist())))
+
+    def fingerprints(self, name):
+        """
+        Return an array with the winnowing fingerprints of a document.
+        """
+
+        return self._load(name)['fingerprints']
+
+    def text(self, name):
+        """
+        Return the original text of an archived document.
+        """
+
+        return _load_text(self._load(name))
+
+    def document(self, name):
+        """
+        Return an ArchivedDocument handle that reads the text of an archived
+        document on demand.
+        """
+
+        return ArchivedDocument(self._file(self.documents[name]['hash']),
+                                name)
+
+    def _load(self, name):
+        return np.load(self._file(self.documents[name]['hash']))
+
+    def _file(self, digest):
+        return os.path.join(self.path, digest + '.npz')
+
+
+class ArchivedDocument(LazyDocument):
+    """
+    A LazyDocument whose text is stored in an archived document file.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'ArchivedDocument(%r)' % self.name
+
+    def read(self):
+        """
+        Read text from the archive without caching it.
+        """
+
+        if self._text is not None:
+            return self._text
+        return _load_text(np.load(self.path))
+
+
+def _load_text(data):
+    return zlib.decompress(data['text'].tobytes()).decode('utf8')
+
+
+def _pack(tokens):
+    """
+    Pack a list of strings into a compact uint8 array.
+
+    Raises ValueError if a string contains the SEP character.
+    """
+
+    if any(SEP in tok for tok in tokens):
+        raise ValueError('tokens cannot contain %r' % SEP)
+    data = SEP.join(tokens).encode('utf8')
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _unpack(data):
+    """
+    Inverse of _pack().
+    """
+
+    data = data.tobytes().decode('utf8')
+    return data.split(SEP) if data else []
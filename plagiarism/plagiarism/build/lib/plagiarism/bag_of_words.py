@@ -1,10 +1,14 @@
+import os
 from collections import Counter
 
 import numpy as np
+from scipy import sparse as sp_sparse
 
-from plagiarism.math_utils import similarity
+from plagiarism.corpus import CorpusStatistics
+from plagiarism.math_utils import row_norms, similarity_block, \
+    similarity_pairs
 from plagiarism.tokenizers import stemmize
-from plagiarism.utils import count_all, tokens_all
+from plagiarism.utils import tokens_all, is_id_array
 
 
 def apply_weights(counter, weights, default=1):
@@ -30,7 +34,8 @@ def bag_of_words(document, method='boolean', weights=None,
 
     Args:
         document:
-            Can be a string of text or a list of stems. If data is a string, it
+            Can be a string of text, a list of stems or an array of token ids
+            (see plagiarism.vocabulary.Vocabulary). If data is a string, it
             will be converted to a list of stems using the given tokenizer
             function.
         method:
@@ -57,7 +62,11 @@ def bag_of_words(document, method='boolean', weights=None,
     if isinstance(document, str):
         tokenizer = tokenizer or stemmize
         document = tokenizer(document, **kwargs)
-    count = Counter(document)
+    if is_id_array(document):
+        ids, counts = np.unique(document, return_counts=True)
+        count = Counter(dict(zip(ids.tolist(), counts.tolist())))
+    else:
+        count = Counter(document)
 
     if method == 'boolean':
         return Counter({stem: 1 for stem in count})
@@ -67,7 +76,7 @@ def bag_of_words(document, method='boolean', weights=None,
     elif method == 'count':
         return count
     elif method == 'weighted':
-        counter = bag_of_words(document, 'frequency')
+        counter = bag_of_words(count, 'frequency')
         return apply_weights(counter, weights)
     else:
         raise ValueError('invalid method: %r' % method)
@@ -81,52 +90,179 @@ def bag_of_documents(documents, method='weighted', **kwargs):
     if method != 'weighted':
         return [bag_of_words(doc, method=method, **kwargs) for doc in documents]
 
-    bag = bag_of_documents(documents, method='frequency', **kwargs)
-    weights = count_all(documents, method='log-doc-freq')
-    result = []
-    for counter in bag:
-        new = apply_weights(counter, weights)
-        result.append(new)
-    return result
+    # Weights are computed from the document-term matrix in a single pass
+    if any(isinstance(doc, str) for doc in documents):
+        tokenizer = kwargs.pop('tokenizer', None) or stemmize
+        documents = [tokenizer(doc, **kwargs) if isinstance(doc, str) else doc
+                     for doc in documents]
+    return CorpusStatistics(documents).bag_of_documents('weighted')
 
 
-def vectorize(bag, default=0.0, tokens=None):
+def vectorize(bag, default=0.0, tokens=None, sparse=False):
     """
     Convert bag of documents to matrix.
 
-    Return:
-         tokens:
-            A list of tokens mapping to their respective indexes.
-         default:
+    Args:
+        bag:
+            A list of Counter objects mapping tokens to their weights.
+        default:
             Default value to assign to a token that does not exist on a
-            document.
+            document. Sparse matrices only support the default value of 0.
+        tokens:
+            A list of tokens mapping to their respective indexes.
+        sparse (bool):
+            If True, return a scipy.sparse CSR matrix built directly from the
+            bag of words without materializing the dense array.
+
+    Return:
          matrix:
             A matrix representing the full bag of documents.
     """
 
     tokens = tokens or tokens_all(bag)
+    if sparse:
+        return _sparse_vectorize(bag, tokens, default)
     data = [[doc.get(tok, default) for tok in tokens] for doc in bag]
     return np.array(data)
 
 
-def similarity_matrix(data, method='triangular', diag=1.0, norm=None):
+def _sparse_vectorize(bag, tokens, default=0.0):
+    """
+    Convert bag of documents to a CSR matrix with len(tokens) columns.
+
+    Tokens that are not present in the given list of tokens are ignored.
+    """
+
+    if default != 0:
+        raise ValueError('sparse matrices require default=0, got %r' % default)
+
+    index = {tok: i for i, tok in enumerate(tokens)}
+    indptr = [0]
+    indices = []
+    values = []
+    for doc in bag:
+        for tok, value in doc.items():
+            col = index.get(tok)
+            if col is not None and value != 0:
+                indices.append(col)
+                values.append(value)
+        indptr.append(len(indices))
+
+    shape = (len(indptr) - 1, len(tokens))
+    matrix = sp_sparse.csr_matrix(
+        (np.array(values, dtype=float), np.array(indices, dtype=np.int32),
+         np.array(indptr, dtype=np.int64)),
+        shape=shape)
+    matrix.sort_indices()
+    return matrix
+
+
+def similarity_matrix(data, method='triangular', diag=1.0, norm=None,
+                      block=256, filename=None):
     """
     Return the similarity matrix from a matrix.
+
+    Data can be a dense array, a scipy.sparse matrix or a bag of documents.
+    The matrix is computed in square tiles of block x block pairs using the
+    vectorized kernels in plagiarism.math_utils.
+
+    Args:
+        data:
+            Matrix in which each row represents a document.
+        method, norm:
+            Similarity method and norm. See plagiarism.math_utils.similarity.
+        diag:
+            Value assigned to the diagonal.
+        block (int):
+            Tile size. Besides the input data, memory usage is bounded by a
+            few block x block arrays (and block x columns for the dense L1
+            kernel).
+        filename:
+            If given, the result is written tile by tile to a numpy memmap
+            stored in this file instead of being allocated in memory.
     """
 
-    size = len(data)
-    if not isinstance(data, np.ndarray):
-        data = vectorize(data)
-    result = np.zeros([size, size], dtype=float) + diag
-    for i in range(size):
-        vi = data[i]
-        for j in range(i + 1, size):
-            vj = data[j]
-            value = similarity(vi, vj, method, norm=norm)
-            result[i, j] = result[j, i] = value
+    size = data.shape[0] if hasattr(data, 'shape') else len(data)
+    if not isinstance(data, np.ndarray) and not sp_sparse.issparse(data):
+        data = vectorize(data, sparse=True)
+    if sp_sparse.issparse(data):
+        data = data.tocsr()
+    norm_func = 'l2' if method == 'angle' else norm
+    try:
+        norms = row_norms(data, norm_func)
+    except (ValueError, TypeError):
+        norms = None
+
+    if filename is None:
+        result = np.empty([size, size], dtype=float)
+    else:
+        result = np.memmap(filename, dtype=float, mode='w+',
+                           shape=(size, size))
+
+    for start in range(0, size, block):
+        stop = min(start + block, size)
+        rows = data[start:stop]
+        for col_start in range(start, size, block):
+            col_stop = min(col_start + block, size)
+            values = similarity_block(
+                rows, data[col_start:col_stop], method, norm=norm,
+                norms_a=None if norms is None else norms[start:stop],
+                norms_b=None if norms is None else norms[col_start:col_stop],
+            )
+            result[start:stop, col_start:col_stop] = values
+            result[col_start:col_stop, start:stop] = values.T
+        idx = np.arange(start, stop)
+        result[idx, idx] = diag
+
+    if filename is not None:
+        result.flush()
     return result
 
 
+def pairs_similarity_matrix(data, pairs, method='triangular', diag=1.0,
+                            norm=None):
+    """
+    Return a sparse symmetric similarity matrix in which only the given pairs
+    of documents are scored.
+
+    Args:
+        data:
+            Matrix in which each row represents a document.
+        pairs:
+            A sequence of (i, j) pairs or a (size x 2) array of indexes.
+        method, norm:
+            Similarity method and norm. See plagiarism.math_utils.similarity.
+        diag:
+            Value assigned to the diagonal.
+    """
+
+    size = data.shape[0] if hasattr(data, 'shape') else len(data)
+    if not isinstance(data, np.ndarray) and not sp_sparse.issparse(data):
+        data = vectorize(data, sparse=True)
+    pairs = np.sort(np.asarray(pairs, dtype=int).reshape(-1, 2), axis=1)
+    pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+    i, j = pairs[:, 0], pairs[:, 1]
+    values = similarity_pairs(data, i, j, method, norm=norm)
+
+    diagonal = np.arange(size)
+    rows = np.concatenate([i, j, diagonal])
+    cols = np.concatenate([j, i, diagonal])
+    values = np.concatenate([values, values, np.full(size, diag, dtype=float)])
+    return sp_sparse.csr_matrix((values, (rows, cols)), shape=(size, size))
+
+
+def load_similarity_matrix(filename, size=None, mode='r'):
+    """
+    Open a similarity matrix saved by similarity_matrix(..., filename=...) as
+    a read-only numpy memmap.
+    """
+
+    if size is None:
+        itemsize = np.dtype(float).itemsize
+        size = int(round((os.path.getsize(filename) / itemsize) ** 0.5))
+    return np.memmap(filename, dtype=float, mode=mode, shape=(size, size))
+
+
 class SimilarPair(tuple):
     """
     Result of most_similar() function.
@@ -141,7 +277,61 @@ class SimilarPair(tuple):
         self.indexes = indexes
 
 
-def most_similar(documents, similarity=None, n=None):
+PAIR_DTYPE = np.dtype([
+    ('i', np.int32), ('j', np.int32), ('similarity', np.float32),
+])
+
+
+class SimilarPairs:
+    """
+    A sequence of SimilarPair objects backed by a structured numpy array with
+    (i, j, similarity) fields.
+
+    SimilarPair instances are only created for the elements that are
+    actually accessed.
+    """
+
+    def __init__(self, documents, pairs):
+        self.documents = documents
+        self.pairs = pairs
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return SimilarPairs(self.documents, self.pairs[idx])
+        i, j, value = self.pairs[idx]
+        i, j = int(i), int(j)
+        docs = self.documents
+        return SimilarPair(docs[i], docs[j], float(value), (i, j))
+
+    def __iter__(self):
+        for idx in range(len(self.pairs)):
+            yield self[idx]
+
+    def __repr__(self):
+        return 'SimilarPairs(%r)' % self.pairs
+
+    @property
+    def indexes(self):
+        """
+        A (size x 2) array with the (i, j) indexes of each pair.
+        """
+
+        return np.stack([self.pairs['i'], self.pairs['j']], axis=1)
+
+    @property
+    def similarities(self):
+        """
+        Array with the similarity of each pair.
+        """
+
+        return self.pairs['similarity']
+
+
+def most_similar(documents, similarity=None, n=None, threshold=None,
+                 block=256):
     """
     Retrieve the n most similar documents ordered by similarity.
 
@@ -149,29 +339,96 @@ def most_similar(documents, similarity=None, n=None):
         documents:
             List of documents.
         similarity:
-            Similarity matrix.
+            Similarity matrix. If it is a scipy.sparse matrix, only the
+            stored elements are considered as candidate pairs.
         n (int, optional):
-            If given, corresponds to the maximum number of elements returned.
+            If given and positive, corresponds to the maximum number of
+            elements returned.
+        threshold (float, optional):
+            If given, only pairs with similarity greater or equal to the
+            threshold are returned. Without n or threshold, all pairs of a
+            dense matrix are kept in memory, using 12 bytes per pair.
+        block (int):
+            Number of rows of the similarity matrix that are inspected at
+            once.
 
     Returns:
-        A list of (doc[i], doc[j]) pairs.
-    """
-
-    result = []
-    size = len(documents)
-    for i in range(size):
-        for j in range(i + 1, size):
-            item = (similarity[i, j], (i, j))
-            result.append(item)
-    result.sort(reverse=True)
-    result = [idx for sim, idx in result]
-    if n:
-        n = max(len(result), n)
-        result = result[:n]
-
-    docs = documents
-    pair = SimilarPair
-    return [pair(docs[i], docs[j], similarity[i, j], (i, j)) for i, j in result]
+        A SimilarPairs sequence of (doc[i], doc[j]) pairs.
+    """
+
+    selector = _TopPairs(n, threshold)
+    if sp_sparse.issparse(similarity):
+        # Only the stored entries of the upper triangle are considered: pairs
+        # missing from a sparse matrix are treated as not similar at all.
+        upper = sp_sparse.triu(similarity, k=1).tocoo()
+        selector.add(upper.row, upper.col, upper.data)
+    else:
+        # Read a block of rows at a time so memory-mapped matrices are never
+        # loaded in full.
+        size = len(documents)
+        for start in range(0, size, block):
+            stop = min(start + block, size)
+            rows = np.asarray(similarity[start:stop, start:], dtype=float)
+            mask = np.arange(size - start)[None, :] > \
+                np.arange(stop - start)[:, None]
+            if threshold is not None:
+                mask &= rows >= threshold
+            i, j = np.nonzero(mask)
+            selector.add(i + start, j + start, rows[i, j])
+    return SimilarPairs(documents, selector.result())
+
+
+class _TopPairs:
+    """
+    Accumulate (i, j, similarity) triples keeping only the best n of them.
+
+    Pairs are sorted by decreasing similarity; ties are broken by decreasing
+    (i, j) indexes.
+    """
+
+    def __init__(self, n=None, threshold=None):
+        # Like None, a zero or negative n means no limit
+        self.n = n if n is not None and n > 0 else None
+        self.threshold = threshold
+        self.size = 0
+        self.chunks = []
+
+    def add(self, i, j, values):
+        values = np.asarray(values)
+        if self.threshold is not None:
+            mask = values >= self.threshold
+            i, j, values = i[mask], j[mask], values[mask]
+        # Chunks use the types of PAIR_DTYPE: unbounded selections keep
+        # 12 bytes per pair
+        fields = [PAIR_DTYPE[name] for name in PAIR_DTYPE.names]
+        self.chunks.append(tuple(np.asarray(x, dtype=dtype)
+                                 for x, dtype in zip((i, j, values), fields)))
+        self.size += len(values)
+        if self.n is not None and self.size > 2 * self.n + 1024:
+            self.chunks = [self._select()]
+            self.size = len(self.chunks[0][2])
+
+    def _select(self):
+        if not self.chunks:
+            return tuple(np.zeros(0, dtype=PAIR_DTYPE[name])
+                         for name in PAIR_DTYPE.names)
+        i, j, values = (np.concatenate(x) for x in zip(*self.chunks))
+        if self.n is not None and len(values) > self.n:
+            # Partition before sorting, but keep all elements tied with the
+            # n-th value so the tie breaking rule is respected.
+            kth = np.partition(values, len(values) - self.n)[-self.n]
+            mask = values >= kth
+            i, j, values = i[mask], j[mask], values[mask]
+        order = np.lexsort((-j, -i, -values))[:self.n]
+        return i[order], j[order], values[order]
+
+    def result(self):
+        i, j, values = self._select()
+        pairs = np.empty(len(values), dtype=PAIR_DTYPE)
+        pairs['i'] = i
+        pairs['j'] = j
+        pairs['similarity'] = values
+        return pairs
 
 
 def common_tokens_all(documents, n=None, by_document=False):
@@ -0,0 +1,209 @@
+"""
+Content-addressed on-disk cache of tokenized documents.
+
+Entries are keyed by a hash of the document content together with the
+tokenizer name and its arguments, so a document is only tokenized again when
+its content or the tokenization parameters change.
+"""
+
+import hashlib
+import os
+import zlib
+
+__all__ = ['TokenCache', 'get_cache', 'is_cacheable']
+
+#: Default maximum size of the cache directory (256 MiB)
+DEFAULT_MAX_SIZE = 256 << 20
+
+#: Fraction of max_size the cache is reduced to when it overflows. Evicting
+#: below the limit amortizes the directory scan over many insertions.
+LOW_WATER = 0.75
+
+#: Salt mixed into every key. Increment it whenever the entry format or the
+#: output of a tokenizer changes without a change of its name.
+CACHE_VERSION = 2
+
+SEP = '\0'
+SUFFIX = '.tok'
+
+#: Qualified name parts shared by unrelated functions
+ANONYMOUS_NAMES = ('<lambda>', '<locals>')
+
+
+class TokenCache:
+    """
+    A directory of zlib-compressed token lists with LRU eviction.
+
+    The access time of each entry is tracked by its modification time, which
+    is updated on every hit. When the total size of the entries exceeds
+    max_size, the least recently used entries are removed until the size
+    drops to LOW_WATER * max_size.
+
+    Args:
+        path:
+            Cache directory. It is created if it does not exist.
+        max_size (int):
+            Maximum total size of the entries in bytes. None disables
+            eviction.
+
+    Attributes:
+        hits, misses:
+            Number of successful and failed lookups since creation.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def __repr__(self):
+        return 'TokenCache(%r, hits=%s, misses=%s)' % (self.path, self.hits,
+                                                       self.misses)
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    @property
+    def size(self):
+        """
+        Total size of the cache entries in bytes.
+        """
+
+        return self._size
+
+    def key(self, text, tokenizer_id):
+        """
+        Return the cache key for a text tokenized by the tokenizer with the
+        given identifier (see plagiarism.tokenizers.tokenizer_name()).
+
+        Raises ValueError if the identifier does not pass is_cacheable().
+        """
+
+        if not is_cacheable(tokenizer_id):
+            raise ValueError('cannot cache tokens of anonymous tokenizer %r'
+                             % tokenizer_id)
+        digest = hashlib.sha256(b'%d' % CACHE_VERSION)
+        digest.update(SEP.encode('utf8'))
+        digest.update(tokenizer_id.encode('utf8'))
+        digest.update(SEP.encode('utf8'))
+        digest.update(text.encode('utf8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return the list of tokens stored under key, or None.
+        """
+
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as F:
+                data = F.read()
+            tokens = _unpack(data)
+        except (OSError, zlib.error, UnicodeDecodeError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return tokens
+
+    def put(self, key, tokens):
+        """
+        Store a list of tokens under key.
+
+        Only lists of strings without null characters can be stored. Returns
+        False if the tokens were not stored.
+        """
+
+        if not all(isinstance(tok, str) and SEP not in tok for tok in tokens):
+            return False
+        path = self._file(key)
+        if os.path.exists(path):
+            self._size -= os.path.getsize(path)
+        data = _pack(tokens)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as F:
+            F.write(data)
+        os.replace(path + '.tmp', path)
+        self._size += len(data)
+        if self.max_size is not None and self._size > self.max_size:
+            self.evict(int(self.max_size * LOW_WATER))
+        return True
+
+    def evict(self, max_size=0):
+        """
+        Remove least recently used entries until the cache size is at most
+        max_size bytes.
+        """
+
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        self.evict(0)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + SUFFIX)
+
+    def _entries(self):
+        """
+        Iterate over (mtime, path, size) tuples for all entries.
+        """
+
+        for root, _, files in os.walk(self.path):
+            for file in files:
+                if not file.endswith(SUFFIX):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+
+def is_cacheable(tokenizer_id):
+    """
+    Return True if tokenizer_id identifies a single tokenizer across runs.
+
+    Lambdas and nested functions are named after their enclosing scope, so
+    different functions would share the same cache entries.
+    """
+
+    return not any(name in tokenizer_id for name in ANONYMOUS_NAMES)
+
+
+def get_cache(cache):
+    """
+    Return a TokenCache from a cache instance or a directory path.
+    """
+
+    if cache is None or isinstance(cache, TokenCache):
+        return cache
+    return TokenCache(cache)
+
+
+def _pack(tokens):
+    return zlib.compress(SEP.join(tokens).encode('utf8', 'surrogatepass'))
+
+
+def _unpack(data):
+    data = zlib.decompress(data).decode('utf8', 'surrogatepass')
+    return data.split(SEP) if data else []
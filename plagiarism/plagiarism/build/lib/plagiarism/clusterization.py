@@ -1,18 +1,54 @@
-import scipy
+import collections
+import concurrent.futures
+import mmap
+import os
 
-from plagiarism.bag_of_words import BagOfWordsClassifier
+import numpy as np
+import scipy.cluster.vq
+from scipy import sparse as sp_sparse
 
+from plagiarism.bag_of_words import bag_of_documents, vectorize, \
+    similarity_matrix, SimilarPair, SimilarPairs
+from plagiarism.math_utils import column_std
+from plagiarism.tokenizers import tokenize_all
 
-def kmeans(job, k, whiten=True):
+
+def documents_similarity(documents, tokenizer=None, method='triangular',
+                         norm='l1'):
+    """
+    Compute the similarity matrix for a list of texts using a sparse bag of
+    words representation.
+    """
+
+    tokenized = tokenize_all(documents, tokenizer=tokenizer)
+    bag = bag_of_documents(tokenized, method='weighted')
+    data = vectorize(bag, sparse=True)
+    return similarity_matrix(data, method=method, norm=norm)
+
+
+def kmeans(job, k, whiten=True, seed=None, minibatch=False, **kwargs):
     """
     Performs a k-means classification for all documents in the given job.
 
     Args:
-        job (list or NPLJob):
-            A list of texts or a natural language processing job (NPLJob)
-            instance.
+        job (list or array):
+            A list of texts or a precomputed feature matrix, such as a
+            similarity matrix. The matrix can be a dense array, a numpy memmap
+            (as returned by similarity_matrix(..., filename=...)) or a
+            scipy.sparse matrix.
         k (int):
             The desired number of clusters.
+        seed:
+            Optional seed for the random initialization of centroids.
+        minibatch (bool):
+            If True, use minibatch_kmeans(), which works directly on sparse
+            and memory-mapped matrices. Texts are then represented by their
+            sparse weighted bag of words instead of a N x N similarity
+            matrix, so memory and time grow linearly with the number of
+            documents. Memory-mapped matrices always use this method, so
+            they are never loaded in memory at once.
+        **kwargs:
+            Extra arguments passed to minibatch_kmeans().
 
     Return:
         centroids:
@@ -22,15 +58,412 @@ def kmeans(job, k, whiten=True):
             for the i-th document.
     """
 
-    if not isinstance(job, BagOfWordsClassifier):
-        job = BagOfWordsClassifier(job)
+    if sp_sparse.issparse(job):
+        data = job.tocsr().astype(float)
+    elif isinstance(job, np.memmap):
+        # Loading the file in memory would defeat the purpose of a memmap
+        data = job
+        minibatch = True
+    elif isinstance(job, np.ndarray):
+        # Copy, so whitening never modifies the caller's array
+        data = np.array(job, dtype=float)
+    elif minibatch:
+        tokenized = tokenize_all(list(job))
+        data = vectorize(bag_of_documents(tokenized), sparse=True)
+    else:
+        data = documents_similarity(list(job))
 
-    data = job.similarity_matrix()
     std = 1
     if whiten:
-        std = data.std(axis=0)
+        std = column_std(data)
         std[std == 0] = 1
-        data /= std[None, :]
-    centroids, labels = scipy.cluster.vq.kmeans2(data, k, minit='points')
+
+    if minibatch:
+        return minibatch_kmeans(data, k, seed=seed, scale=std, **kwargs)
+
+    if whiten:
+        if sp_sparse.issparse(data):
+            data = data @ sp_sparse.diags(1 / std)
+        else:
+            data /= std[None, :]
+
+    # scipy's kmeans2 only understands dense arrays
+    if sp_sparse.issparse(data):
+        data = data.toarray()
+    centroids, labels = scipy.cluster.vq.kmeans2(data, k, minit='points',
+                                                 seed=seed)
     centroids *= std
-    return centroids, labels
\ No newline at end of file
+    return centroids, labels
+
+
+def minibatch_kmeans(data, k, batch_size=256, max_iter=100, n_init=3,
+                     init='k-means++', seed=None, jobs=None, tol=1e-4,
+                     scale=None, chunk=4096):
+    """
+    Mini-batch k-means (Sculley, 2010).
+
+    Centroids are updated from random batches of rows, so each iteration
+    costs O(batch_size * k) regardless of the number of documents. Rows are
+    only read in batches and chunks, hence data may be a memory-mapped
+    array or a sparse matrix.
+
+    Args:
+        data:
+            A (n_documents x n_features) dense array, memmap or
+            scipy.sparse matrix.
+        k (int):
+            Number of clusters.
+        batch_size (int):
+            Number of rows in each batch.
+        max_iter (int):
+            Maximum number of batches in each run.
+        n_init (int):
+            Number of runs with different initializations. The run with the
+            smallest inertia is returned.
+        init:
+            'k-means++' (default) or 'random'. Initial centroids are chosen
+            from a sample of rows.
+        seed:
+            Seed of the random number generator.
+        jobs (int):
+            If greater than 1, the runs are distributed in a process pool.
+            Memory-mapped data is reopened read-only by each worker instead
+            of being copied to it.
+        tol (float):
+            A run stops when the squared centroid shift in one iteration is
+            smaller than tol times the squared norm of the centroids.
+        scale:
+            Optional array. Columns are divided by scale when read. The
+            returned centroids are multiplied by it.
+        chunk (int):
+            Number of rows used at once when computing the final labels.
+
+    Return:
+        centroids:
+            A (k x n_features) array.
+        labels:
+            An array with the cluster index of each document.
+    """
+
+    if sp_sparse.issparse(data):
+        data = data.tocsr()
+    size = data.shape[0]
+    if not 0 < k <= size:
+        raise ValueError('k must be between 1 and the number of documents')
+    if init not in ('k-means++', 'random'):
+        raise ValueError('invalid init: %r' % init)
+    if scale is not None:
+        scale = np.asarray(scale, dtype=float)
+
+    rng = np.random.RandomState(seed)
+    seeds = rng.randint(0, 2 ** 31 - 1, size=n_init)
+    if jobs is not None and jobs < 0:
+        jobs = os.cpu_count() or 1
+    parallel = jobs and jobs > 1 and n_init > 1
+    source = _memmap_file(data) if parallel else None
+    args = [(source or data, k, batch_size, max_iter, init, run_seed, tol,
+             scale, chunk) for run_seed in seeds]
+    if parallel:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            runs = list(pool.map(_minibatch_run, args))
+    else:
+        runs = list(map(_minibatch_run, args))
+
+    centroids, labels, _ = min(runs, key=lambda x: x[2])
+    if scale is not None:
+        centroids = centroids * scale
+    return centroids, labels
+
+
+def _minibatch_run(args):
+    """
+    A single run of minibatch_kmeans(). Returns (centroids, labels, inertia)
+    in scaled coordinates.
+    """
+
+    data, k, batch_size, max_iter, init, seed, tol, scale, chunk = args
+    if isinstance(data, MemmapFile):
+        data = np.memmap(data.filename, dtype=data.dtype, mode='r',
+                         offset=data.offset, shape=data.shape,
+                         order=data.order)
+    rng = np.random.RandomState(seed)
+    size = data.shape[0]
+    batch_size = min(batch_size, size)
+
+    # Initial centroids from a sample of rows
+    sample = np.sort(rng.choice(size, min(size, max(batch_size, 10 * k)),
+                                replace=False))
+    sample = _read_rows(data, sample, scale)
+    if init == 'random':
+        centroids = _dense(sample[rng.choice(sample.shape[0], k,
+                                             replace=False)])
+    else:
+        centroids = _kmeans_plus_plus(sample, k, rng)
+
+    counts = np.zeros(k)
+    for _ in range(max_iter):
+        idx = np.sort(rng.choice(size, batch_size, replace=False))
+        rows = _read_rows(data, idx, scale)
+        labels, _ = _nearest(rows, centroids)
+
+        # Each centroid moves to the running mean of all rows assigned to it
+        assign = sp_sparse.csr_matrix(
+            (np.ones(len(idx)), (labels, np.arange(len(idx)))),
+            shape=(k, len(idx)))
+        sums = _dense(assign @ rows)
+        batch_counts = np.bincount(labels, minlength=k)
+        counts += batch_counts
+        mask = batch_counts > 0
+        shift = (sums[mask] - batch_counts[mask, None] * centroids[mask]) / \
+            counts[mask, None]
+        centroids[mask] += shift
+        if (shift ** 2).sum() <= tol * max((centroids ** 2).sum(), 1e-12):
+            break
+
+    # Final assignment of all rows
+    labels = np.zeros(size, dtype=int)
+    inertia = 0.0
+    for start in range(0, size, chunk):
+        idx = np.arange(start, min(start + chunk, size))
+        labels[idx], dist = _nearest(_read_rows(data, idx, scale), centroids)
+        inertia += dist.sum()
+    return centroids, labels, inertia
+
+
+def _kmeans_plus_plus(rows, k, rng):
+    """
+    Choose k rows with the k-means++ seeding strategy.
+    """
+
+    size = rows.shape[0]
+    centroids = [_dense(rows[[rng.randint(size)]])[0]]
+    dist = _nearest(rows, np.array(centroids))[1]
+    for _ in range(1, k):
+        total = dist.sum()
+        if total > 0:
+            idx = rng.choice(size, p=dist / total)
+        else:
+            idx = rng.randint(size)
+        centroids.append(_dense(rows[[idx]])[0])
+        dist = np.minimum(dist, _nearest(rows, centroids[-1][None, :])[1])
+    return np.array(centroids)
+
+
+def _nearest(rows, centroids):
+    """
+    Return the index of the nearest centroid to each row and the squared
+    distance to it.
+    """
+
+    if sp_sparse.issparse(rows):
+        norms = np.asarray(rows.multiply(rows).sum(axis=1)).ravel()
+    else:
+        norms = (rows ** 2).sum(axis=1)
+    dist = -2 * np.asarray(rows @ centroids.T)
+    dist += norms[:, None]
+    dist += (centroids ** 2).sum(axis=1)[None, :]
+    labels = dist.argmin(axis=1)
+    return labels, np.maximum(dist[np.arange(len(labels)), labels], 0)
+
+
+#: Location of a memory-mapped array, used to reopen it in worker processes
+MemmapFile = collections.namedtuple('MemmapFile', [
+    'filename', 'dtype', 'shape', 'offset', 'order',
+])
+
+
+def _memmap_file(data):
+    """
+    Return a MemmapFile for a memmap that maps a whole file region, or None
+    for other arrays (including views of memmaps, whose offset is unknown).
+    """
+
+    if not isinstance(data, np.memmap) or data.filename is None or \
+            not isinstance(data.base, mmap.mmap):
+        return None
+    if data.flags.c_contiguous:
+        order = 'C'
+    elif data.flags.f_contiguous:
+        order = 'F'
+    else:
+        return None
+    return MemmapFile(data.filename, data.dtype, data.shape, data.offset,
+                      order)
+
+
+def _read_rows(data, idx, scale=None):
+    """
+    Read rows of a dense, memory-mapped or sparse matrix as float.
+    """
+
+    if sp_sparse.issparse(data):
+        rows = data[idx].astype(float)
+        if scale is not None:
+            rows = (rows @ sp_sparse.diags(1 / scale)).tocsr()
+        return rows
+    rows = np.array(data[idx], dtype=float)
+    if scale is not None:
+        rows /= scale
+    return rows
+
+
+def _dense(data):
+    if sp_sparse.issparse(data):
+        return data.toarray()
+    return np.array(data, dtype=float)
+
+
+#: A connected component of the thresholded similarity graph
+Ring = collections.namedtuple('Ring', [
+    'members', 'size', 'pairs', 'min_similarity', 'max_similarity',
+    'mean_similarity', 'density',
+])
+
+
+class UnionFind:
+    """
+    Disjoint sets of integer indexes with union by size and path halving.
+
+    The structure grows automatically when larger indexes are used.
+
+    Examples:
+        >>> sets = UnionFind()
+        >>> sets.union(0, 1)
+        0
+        >>> sets.find(1) == sets.find(0)
+        True
+    """
+
+    def __init__(self, size=0):
+        self.parent = list(range(size))
+        self.sizes = [1] * size
+
+    def __len__(self):
+        return len(self.parent)
+
+    def find(self, x):
+        """
+        Return the representative element of the set containing x.
+        """
+
+        if x >= len(self.parent):
+            self._grow(x + 1)
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """
+        Merge the sets containing a and b and return the new representative.
+        """
+
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.sizes[a] < self.sizes[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.sizes[a] += self.sizes[b]
+        return a
+
+    def groups(self):
+        """
+        Return a dictionary mapping representatives to the sorted list of
+        elements in their sets.
+        """
+
+        result = collections.defaultdict(list)
+        for x in range(len(self.parent)):
+            result[self.find(x)].append(x)
+        return dict(result)
+
+    def _grow(self, size):
+        n = len(self.parent)
+        self.parent.extend(range(n, size))
+        self.sizes.extend([1] * (size - n))
+
+
+def similarity_rings(pairs, threshold=0.0, size=None, min_size=2):
+    """
+    Group documents connected by similar pairs into "plagiarism rings".
+
+    Pairs with similarity >= threshold are edges of a graph and each
+    connected component of this graph is a ring. The components are found
+    with a union-find structure in a single pass over the pairs.
+
+    Args:
+        pairs:
+            A SimilarPairs sequence (see bag_of_words.most_similar()), a
+            sequence of SimilarPair objects or any iterable of
+            (i, j, similarity) tuples, which may be a generator. Pairs of
+            a document with itself are ignored. Repeated pairs, in any
+            order, count as a single edge with their largest similarity.
+        threshold (float):
+            Minimum similarity of pairs used as edges.
+        size (int):
+            Total number of documents. Only required to report isolated
+            documents when min_size=1.
+        min_size (int):
+            Smallest number of documents in a returned ring.
+
+    Return:
+        A list of Ring tuples, from the largest ring to the smallest. Each
+        ring has the sorted list of document indexes (members), the number
+        of documents (size), the number of edges (pairs), the minimum, maximum
+        and mean similarity of the edges and the fraction of the possible
+        pairs of members that are edges (density).
+    """
+
+    sets = UnionFind(size or 0)
+    edges = {}
+    for i, j, similarity in _iter_pairs(pairs):
+        if i == j:
+            sets.find(i)
+        elif similarity >= threshold:
+            sets.union(i, j)
+            edge = (i, j) if i < j else (j, i)
+            edges[edge] = max(similarity, edges.get(edge, similarity))
+
+    stats = collections.defaultdict(list)
+    for (i, _), similarity in edges.items():
+        stats[sets.find(i)].append(similarity)
+
+    result = []
+    for root, members in sets.groups().items():
+        n = len(members)
+        if n < min_size:
+            continue
+        values = stats.get(root)
+        if values:
+            n_pairs = len(values)
+            ring = Ring(members, n, n_pairs, min(values), max(values),
+                        sum(values) / n_pairs, n_pairs / (n * (n - 1) / 2))
+        else:
+            ring = Ring(members, n, 0, None, None, None, 0.0)
+        result.append(ring)
+
+    result.sort(key=lambda r: (-r.size, -(r.max_similarity or 0),
+                               r.members[0]))
+    return result
+
+
+def _iter_pairs(pairs):
+    """
+    Iterate over (i, j, similarity) tuples from any of the pair sources
+    accepted by similarity_rings().
+    """
+
+    if isinstance(pairs, SimilarPairs):
+        data = pairs.pairs
+        yield from zip(data['i'].tolist(), data['j'].tolist(),
+                       data['similarity'].tolist())
+        return
+    for pair in pairs:
+        if isinstance(pair, SimilarPair):
+            i, j = pair.indexes
+            yield i, j, pair.similarity
+        else:
+            i, j, similarity = pair
+            yield int(i), int(j), float(similarity)
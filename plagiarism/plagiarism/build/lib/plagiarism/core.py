@@ -1,10 +1,14 @@
+import heapq
 import string
 from collections import Counter, OrderedDict
 
 import numpy as np
 import scipy as sp
 import scipy.cluster.vq
+from scipy import sparse as sp_sparse
 
+from plagiarism.clusterization import minibatch_kmeans
+from plagiarism.math_utils import column_std
 from plagiarism.stopwords import get_stop_words
 from plagiarism.tokenizers import split_to_words
 from plagiarism.tokens import CodeTokenizer
@@ -58,7 +62,28 @@ class Document:
 def ascii_moving_average(text):
     N = len(text)
     weight = N * (N - 1) / 2
-    return sum(i * ord(x) for (i, x) in enumerate(text)) / weight
+    codes = char_codes(text).astype(float)
+    return float(np.arange(N, dtype=float) @ codes) / weight
+
+
+def char_codes(text):
+    """
+    Return an uint32 array with the ordinals of all characters of text.
+    """
+
+    return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'),
+                         dtype=np.uint32)
+
+
+# Character classes used by TextDocument. Each ascii character is mapped to
+# a combination of bit flags.
+WHITESPACE, LOWER, UPPER, DIGIT = 1, 2, 4, 8
+CHAR_CLASSES = np.zeros(128, dtype=np.uint8)
+for _group, _flag in [(string.whitespace, WHITESPACE),
+                      (string.ascii_lowercase, LOWER),
+                      (string.ascii_uppercase, UPPER),
+                      (string.digits, DIGIT)]:
+    CHAR_CLASSES[[ord(c) for c in _group]] = _flag
 
 
 class TextDocument(Document):
@@ -69,6 +94,7 @@ class TextDocument(Document):
     def __init__(self, data):
         super().__init__(data)
         self._size = len(self.data)
+        self._stats = None
 
     def core_metrics(self, segmentation=None):
         if isinstance(segmentation, str):
@@ -127,39 +153,37 @@ class TextDocument(Document):
         Fraction whitespace characters.
         """
 
-        return self.group_ratio(string.whitespace)
+        return self.char_stats()['whitespace'] / self._size
 
     def letters_ratio(self):
         """
         Fraction ascii letters.
         """
 
-        return self.group_ratio(string.ascii_letters)
+        return self.char_stats()['letters'] / self._size
 
     def digits_ratio(self):
         """
         Fraction digit characters.
         """
 
-        return self.group_ratio(string.digits)
+        return self.char_stats()['digits'] / self._size
 
     def lower_ratio(self):
         """
-        Fraction digit characters.
+        Fraction of lowercase characters among ascii letters.
         """
 
-        letters = string.ascii_letters
-        lowercase = string.ascii_lowercase
-        return self.group_count(lowercase) / self.group_count(letters)
+        stats = self.char_stats()
+        return stats['lower'] / stats['letters']
 
     def upper_ratio(self):
         """
-        Fraction digit characters.
+        Fraction of uppercase characters among ascii letters.
         """
 
-        letters = string.ascii_letters
-        uppercase = string.ascii_uppercase
-        return self.group_count(uppercase) / self.group_count(letters)
+        stats = self.char_stats()
+        return stats['upper'] / stats['letters']
 
     def group_ratio(self, group):
         """
@@ -173,21 +197,59 @@ class TextDocument(Document):
         Return the number of occurrences of characters in the group.
         """
 
-        return sum(1.0 for x in self.data if x in group)
+        codes = char_codes(self.data)
+        return float(np.isin(codes, [ord(c) for c in group]).sum())
+
+    def char_stats(self):
+        """
+        Return a dictionary with the character class counts and the sums used
+        by the moving averages.
+
+        Everything is computed in a single vectorized pass over the text and
+        cached.
+        """
+
+        if self._stats is not None:
+            return self._stats
+
+        codes = char_codes(self.data)
+        # DEL (127) belongs to no class, so it also stands for non-ascii
+        flags = CHAR_CLASSES[np.minimum(codes, 127)]
+        counts = np.bincount(flags, minlength=16)
+        lower, upper = float(counts[LOWER]), float(counts[UPPER])
+
+        # sum_i i * c_i, with i counting from the start (forward) or the end
+        # (reverse) of the text: reverse = (N - 1) * sum_i c_i - forward
+        values = codes.astype(float)
+        forward = float(np.arange(len(codes), dtype=float) @ values)
+        reverse = (len(codes) - 1) * float(values.sum()) - forward
+
+        self._stats = {
+            'whitespace': float(counts[WHITESPACE]),
+            'digits': float(counts[DIGIT]),
+            'lower': lower,
+            'upper': upper,
+            'letters': lower + upper,
+            'forward': forward,
+            'reverse': reverse,
+        }
+        return self._stats
 
     def ascii_moving_average(self):
         """
         Moving average for ascii ordinals.
         """
 
-        return ascii_moving_average(self.data)
+        N = self._size
+        return self.char_stats()['forward'] / (N * (N - 1) / 2)
 
     def ascii_moving_average_rev(self):
         """
         Moving average for ascii ordinals in reverse order.
         """
 
-        return ascii_moving_average(self.data[::-1])
+        N = self._size
+        return self.char_stats()['reverse'] / (N * (N - 1) / 2)
 
 
 class CodeDocument(TextDocument):
@@ -287,21 +349,81 @@ class Job:
         # Select the most common, if required
         if limit is None:
             return sorted(metrics.keys())
-        counter = Counter(metrics)
-        common = counter.most_common(limit)
-        return sorted(common.keys())
+        common = heapq.nlargest(limit, metrics.items(), key=lambda x: x[1])
+        return sorted(k for k, _ in common)
+
+    def core_matrix(self):
+        """
+        Return a dense array with the core metrics of all documents.
+        """
+
+        data = [document.metrics()[0] for document in self.data.values()]
+        return np.array(data, dtype=float).reshape(len(self.data), -1)
 
-    def ndarray(self, metrics=None, whiten=True):
+    def optional_matrix(self, metrics=None):
+        """
+        Return a CSR matrix with the given optional metrics (columns) of all
+        documents (rows).
+        """
+
+        if metrics is None:
+            metrics = self.select_metrics()
+        index = {name: i for i, name in enumerate(metrics)}
+        indptr = [0]
+        indices = []
+        values = []
+        for document in self.data.values():
+            for name, value in document.metrics()[1].items():
+                col = index.get(name)
+                if col is not None and value:
+                    indices.append(col)
+                    values.append(value)
+            indptr.append(len(indices))
+
+        shape = (len(self.data), len(index))
+        matrix = sp_sparse.csr_matrix(
+            (np.array(values, dtype=float), np.array(indices, dtype=np.int32),
+             np.array(indptr, dtype=np.int64)),
+            shape=shape)
+        matrix.sort_indices()
+        return matrix
+
+    def ndarray(self, metrics=None, whiten=True, sparse=False):
         """
         Convert elements into a numpy array.
+
+        The core metrics and the optional metrics occupy the first and the
+        last columns, respectively.
+
+        Args:
+            metrics:
+                List of optional metrics. Defaults to select_metrics().
+            whiten (bool):
+                If True, normalize all columns to unit variance. Dense arrays
+                are also centered.
+            sparse (bool):
+                If True, return a CSR matrix. Optional metrics are then
+                scaled, but not centered, so they remain sparse. This does
+                not change distances between documents.
         """
 
-        data = np.array(self.elements(metrics), dtype=float)
+        core = self.core_matrix()
+        optional = self.optional_matrix(metrics)
         if whiten:
-            data -= data.mean(axis=0)
-            std = data.std(axis=0)
-            data = data / np.where(std != 0, std, 1)
-        return data
+            core -= core.mean(axis=0)
+            std = core.std(axis=0)
+            core /= np.where(std != 0, std, 1)
+            std = column_std(optional)
+            optional = optional @ sp_sparse.diags(1 / np.where(std != 0, std,
+                                                               1))
+        if sparse:
+            return sp_sparse.hstack([sp_sparse.csr_matrix(core), optional],
+                                    format='csr')
+
+        optional = optional.toarray()
+        if whiten:
+            optional -= optional.mean(axis=0)
+        return np.hstack([core, optional])
 
     def elements(self, metrics=None):
         """
@@ -321,8 +443,21 @@ class Job:
         core, optional = document.metrics()
         return core + [optional.get(metric, 0) for metric in metrics]
 
-    def kmeans(self, k, data=None):
-        data = data or self.ndarray()
+    def kmeans(self, k, data=None, minibatch=False, **kwargs):
+        """
+        Run k-means on the feature matrix of all documents.
+
+        If minibatch is True, plagiarism.clusterization.minibatch_kmeans() is
+        used on the sparse feature matrix and kwargs are passed to it.
+        """
+
+        if minibatch:
+            if data is None:
+                data = self.ndarray(sparse=True)
+            return minibatch_kmeans(data, k, **kwargs)
+
+        if data is None:
+            data = self.ndarray()
         return sp.cluster.vq.kmeans2(data, k, iter=50)
 
     def classify(self, metrics=None, whiten=True):
@@ -0,0 +1,158 @@
+"""
+Corpus statistics computed from a sparse document-term matrix.
+"""
+
+from collections import Counter
+
+import numpy as np
+from scipy import sparse as sp_sparse
+
+from plagiarism.utils import is_id_array
+from plagiarism.vocabulary import Vocabulary
+
+__all__ = ['CorpusStatistics']
+
+
+class CorpusStatistics:
+    """
+    Token statistics of a list of documents.
+
+    The document-term count matrix is built in a single pass over the
+    documents and all statistics are derived from it by vectorized
+    reductions.
+
+    Args:
+        documents:
+            A list of documents. Each document is a sequence of tokens or an
+            array of integer token ids.
+
+    Attributes:
+        counts:
+            CSR matrix with the number of times each token (column) appears
+            in each document (row).
+        tokens:
+            List of tokens associated with each column, in order of first
+            occurrence. For documents of ids, the ids in increasing order.
+
+    Examples:
+        >>> stats = CorpusStatistics([['a', 'b', 'a'], ['b', 'c']])
+        >>> stats.counter('doc')
+        Counter({'b': 2, 'a': 1, 'c': 1})
+    """
+
+    def __init__(self, documents):
+        documents = list(documents)
+        if documents and all(map(is_id_array, documents)):
+            ids = np.concatenate(documents)
+            tokens, cols = np.unique(ids, return_inverse=True)
+            self.tokens = tokens.tolist()
+        else:
+            vocabulary = Vocabulary()
+            documents = vocabulary.encode_all(documents)
+            cols = np.concatenate(documents or [np.zeros(0, dtype=int)])
+            self.tokens = vocabulary.tokens
+
+        sizes = [len(doc) for doc in documents]
+        rows = np.repeat(np.arange(len(documents)), sizes)
+        shape = (len(documents), len(self.tokens))
+        self.counts = sp_sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols.ravel())),
+            shape=shape)
+        self.counts.sum_duplicates()
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    @property
+    def total(self):
+        """
+        Array with the total number of occurrences of each token.
+        """
+
+        return np.asarray(self.counts.sum(axis=0)).ravel()
+
+    @property
+    def doc(self):
+        """
+        Array with the number of documents in which each token appears.
+        """
+
+        return np.bincount(self.counts.indices, minlength=len(self.tokens))
+
+    @property
+    def doc_freq(self):
+        """
+        Array with the fraction of documents in which each token appears.
+        """
+
+        return self.doc / max(len(self), 1)
+
+    @property
+    def idf(self):
+        """
+        Array with the inverse document frequency log(N / n) of each token.
+        """
+
+        return np.log(max(len(self), 1) / np.maximum(self.doc, 1))
+
+    def counter(self, method='total'):
+        """
+        Return a Counter mapping tokens to the given statistic. Accepts the
+        same methods as plagiarism.utils.count_all().
+        """
+
+        try:
+            attr = {'total': 'total', 'doc': 'doc', 'doc-freq': 'doc_freq',
+                    'log-doc-freq': 'idf'}[method]
+        except KeyError:
+            raise ValueError('invalid method: %r' % method)
+        return Counter(dict(zip(self.tokens, getattr(self, attr).tolist())))
+
+    def frequencies(self):
+        """
+        CSR matrix with the relative frequency of each token in each
+        document.
+        """
+
+        sizes = np.asarray(self.counts.sum(axis=1)).ravel().astype(float)
+        sizes[sizes == 0] = 1
+        return sp_sparse.diags(1 / sizes) @ self.counts
+
+    def weighted(self):
+        """
+        CSR matrix with relative frequencies weighted by the inverse document
+        frequency of each token. Tokens present in all documents are kept as
+        explicit zeros.
+        """
+
+        matrix = self.frequencies().tocsr()
+        matrix.data *= self.idf[matrix.indices]
+        return matrix
+
+    def bag_of_documents(self, method='weighted'):
+        """
+        Return a list of Counter objects with the weights of each token in
+        each document. See plagiarism.bag_of_words.bag_of_words() for the
+        available methods.
+        """
+
+        if method == 'weighted':
+            matrix = self.weighted()
+        elif method == 'frequency':
+            matrix = self.frequencies().tocsr()
+        elif method == 'count':
+            matrix = self.counts
+        elif method == 'boolean':
+            matrix = self.counts.sign()
+        else:
+            raise ValueError('invalid method: %r' % method)
+
+        tokens = self.tokens
+        result = []
+        for i in range(matrix.shape[0]):
+            start, end = matrix.indptr[i], matrix.indptr[i + 1]
+            cols = matrix.indices[start:end].tolist()
+            values = matrix.data[start:end].tolist()
+            result.append(Counter({tokens[j]: x
+                                   for j, x in zip(cols, values)}))
+        return result
@@ -0,0 +1,265 @@
+"""
+Incremental version of the find_suspects() similarity stage.
+
+Documents can be added and removed one at a time. The similarity matrix is
+kept up to date without recomputing all pairs, and it matches the result of
+
+    similarity_matrix(data, method='triangular', norm='l1')
+
+in which the rows of data are the IDF-weighted bags of words of the current
+set of documents.
+
+Each document d is represented by its relative token frequencies f_d, weighted
+by the inverse document frequency idf_t = log(N / n_t). The L1 distance
+between two documents decomposes as
+
+    |u - v| = log(N) * sum_t |f_ut - f_vt| - sum_t log(n_t) * |f_ut - f_vt|
+
+The first sum does not depend on the corpus and is computed once per pair.
+The second one only changes, for pairs that involve tokens of the document
+being added or removed, by the change of log(n_t) for those tokens.
+"""
+
+import collections
+from math import log
+
+import numpy as np
+from scipy import sparse as sp_sparse
+
+from plagiarism.bag_of_words import most_similar
+from plagiarism.math_utils import l1_distance_block
+from plagiarism.tokenizers import tokenize_all
+
+__all__ = ['IncrementalSuspects']
+
+
+class IncrementalSuspects:
+    """
+    Keeps the document frequencies, weighted bags of words and pairwise
+    similarity scores of a growing set of documents.
+
+    Args:
+        tokenizer:
+            Tokenizer name or function used on documents passed to add().
+        **kwargs:
+            Extra arguments passed to the tokenizer.
+
+    Examples:
+        >>> suspects = IncrementalSuspects(tokenizer='words')
+        >>> suspects.add('a', 'the cat sat on the mat')
+        >>> suspects.add('b', 'the cat sat on a hat')
+        >>> suspects.add('c', 'dogs bark loudly')
+        >>> suspects.most_similar(1)[0].indexes
+        (0, 1)
+    """
+
+    def __init__(self, tokenizer='words', **kwargs):
+        self.tokenizer = tokenizer
+        self.tokenizer_kwargs = kwargs
+        self.documents = collections.OrderedDict()
+        self.document_frequency = collections.Counter()
+        self.vocabulary = {}
+        self._freqs = []     # list of (columns, frequencies) per document
+        self._mass = np.zeros(0)  # sum of frequencies (0 for empty documents)
+        self._log_mass = np.zeros(0)  # sum_t log(n_t) * f_t
+        self._s1 = np.zeros((0, 0))
+        self._s2 = np.zeros((0, 0))
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, name):
+        return name in self.documents
+
+    @property
+    def names(self):
+        """
+        List of document names in the same order as the similarity matrix.
+        """
+
+        return list(self.documents)
+
+    def add(self, name, text, tokens=None):
+        """
+        Add a document. Tokens can be given if text is already tokenized.
+        """
+
+        if name in self.documents:
+            raise ValueError('document already exists: %r' % name)
+        if tokens is None:
+            tokens = tokenize_all([text], tokenizer=self.tokenizer,
+                                  **self.tokenizer_kwargs)[0]
+
+        # Relative frequencies of the new document
+        count = collections.Counter(tokens)
+        total = sum(count.values())
+        vocabulary = self.vocabulary
+        for tok in count:
+            vocabulary.setdefault(tok, len(vocabulary))
+        cols = np.array([vocabulary[tok] for tok in count], dtype=np.int32)
+        freqs = np.array([n / total for n in count.values()], dtype=float)
+
+        # Document frequencies change for the tokens in the new document
+        old_df = np.array([self.document_frequency[tok] for tok in count],
+                          dtype=float)
+        self.document_frequency.update(count.keys())
+        self._update_log_counts(cols, old_df, old_df + 1)
+
+        # Add row/column for the new document
+        idx = self._size
+        self._grow()
+        self.documents[name] = text
+        self._freqs.append((cols, freqs))
+        self._mass[idx] = freqs.sum()
+        log_df = np.log(old_df + 1)
+        self._log_mass[idx] = (log_df * freqs).sum()
+
+        matrix = self._matrix()
+        row = matrix[idx]
+        s1 = l1_distance_block(row, matrix).ravel()
+        log_weights = sp_sparse.diags(self._log_document_frequency())
+        s2 = l1_distance_block(row @ log_weights, matrix @ log_weights).ravel()
+        self._s1[idx, :idx + 1] = self._s1[:idx + 1, idx] = s1
+        self._s2[idx, :idx + 1] = self._s2[:idx + 1, idx] = s2
+
+    def remove(self, name):
+        """
+        Remove document with the given name.
+        """
+
+        idx = list(self.documents).index(name)
+        text = self.documents.pop(name)
+        cols, freqs = self._freqs.pop(idx)
+
+        # Remove row/column
+        n = self._size
+        for arr in (self._s1, self._s2):
+            arr[idx:n - 1, :n] = arr[idx + 1:n, :n]
+            arr[:n - 1, idx:n - 1] = arr[:n - 1, idx + 1:n]
+        for arr in (self._mass, self._log_mass):
+            arr[idx:n - 1] = arr[idx + 1:n]
+        self._size -= 1
+
+        # Update document frequencies
+        tokens = self._tokens(cols)
+        old_df = np.array([self.document_frequency[tok] for tok in tokens],
+                          dtype=float)
+        self.document_frequency.subtract(tokens)
+        for tok in tokens:
+            if not self.document_frequency[tok]:
+                del self.document_frequency[tok]
+        self._update_log_counts(cols, old_df, old_df - 1)
+        return text
+
+    def similarity_matrix(self, diag=1.0):
+        """
+        Return the similarity matrix for all documents.
+        """
+
+        n = self._size
+        log_n = log(n) if n else 0.0
+        dist = log_n * self._s1[:n, :n] - self._s2[:n, :n]
+        norms = log_n * self._mass[:n] - self._log_mass[:n]
+        total = norms[:, None] + norms[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.where(total == 0, 1.0, 1 - dist / total)
+        np.fill_diagonal(result, diag)
+        return result
+
+    def most_similar(self, n=None, threshold=None):
+        """
+        Return the most similar pairs of documents. See
+        plagiarism.bag_of_words.most_similar().
+        """
+
+        documents = list(self.documents.values())
+        return most_similar(documents, self.similarity_matrix(), n=n,
+                            threshold=threshold)
+
+    #
+    # Auxiliary methods
+    #
+    def _update_log_counts(self, cols, old_df, new_df):
+        """
+        Update the log(n_t) dependent terms for pairs of documents after the
+        document frequency of the tokens in cols changed from old_df to new_df.
+
+        Tokens that were absent from all documents before and after the change
+        do not contribute to any existing pair.
+        """
+
+        mask = (old_df > 0) & (new_df > 0)
+        if not mask.any() or not self._size:
+            return
+        cols = cols[mask]
+        delta = np.log(new_df[mask]) - np.log(old_df[mask])
+        n = self._size
+        matrix = self._matrix()
+        others = np.ones(n, dtype=bool)
+
+        # L1 distances are computed separately for the tokens that gained and
+        # lost weight, since |w * (f_u - f_v)| loses the sign of w.
+        for sign in (1, -1):
+            weights = np.zeros(len(self.vocabulary))
+            weights[cols] = np.maximum(sign * delta, 0)
+            if not weights.any():
+                continue
+            weighted = matrix @ sp_sparse.diags(weights)
+            weighted.eliminate_zeros()
+            affected = np.flatnonzero(np.diff(weighted.indptr))
+            dist = sign * l1_distance_block(weighted[affected], weighted)
+            self._s2[affected, :n] += dist
+            others[:] = True
+            others[affected] = False
+            self._s2[np.ix_(others, affected)] += dist[:, others].T
+            self._log_mass[:n] += \
+                sign * np.asarray(weighted.sum(axis=1)).ravel()
+
+    def _log_document_frequency(self):
+        """
+        Array with log(n_t) for each token in the vocabulary.
+        """
+
+        df = np.ones(len(self.vocabulary))
+        tokens = list(self.vocabulary)
+        df[:len(tokens)] = [max(self.document_frequency[tok], 1)
+                            for tok in tokens]
+        return np.log(df)
+
+    def _matrix(self):
+        """
+        Sparse matrix of relative frequencies.
+        """
+
+        indptr = np.cumsum([0] + [len(cols) for cols, _ in self._freqs])
+        if self._freqs:
+            indices = np.concatenate([cols for cols, _ in self._freqs])
+            data = np.concatenate([freqs for _, freqs in self._freqs])
+        else:
+            indices, data = np.zeros(0, dtype=np.int32), np.zeros(0)
+        shape = (len(self._freqs), len(self.vocabulary))
+        return sp_sparse.csr_matrix((data, indices, indptr), shape=shape)
+
+    def _tokens(self, cols):
+        tokens = list(self.vocabulary)
+        return [tokens[col] for col in cols]
+
+    def _grow(self):
+        """
+        Make room for a new document, doubling buffer capacity if necessary.
+        """
+
+        n = self._size
+        capacity = len(self._mass)
+        if n == capacity:
+            capacity = max(2 * capacity, 16)
+            for attr in ('_s1', '_s2'):
+                new = np.zeros((capacity, capacity))
+                new[:n, :n] = getattr(self, attr)[:n, :n]
+                setattr(self, attr, new)
+            for attr in ('_mass', '_log_mass'):
+                new = np.zeros(capacity)
+                new[:n] = getattr(self, attr)[:n]
+                setattr(self, attr, new)
+        self._size += 1
@@ -0,0 +1,198 @@
+"""
+Find and load documents from the file system.
+"""
+
+import fnmatch
+import locale
+import os
+
+__all__ = ['LazyDocument', 'walk_documents', 'read_text', 'is_binary']
+
+#: Directories and files skipped by walk_documents() unless other exclude
+#: patterns are given: hidden entries (such as .git), caches and bytecode.
+DEFAULT_EXCLUDE = ('.*', '__pycache__', '*.pyc', '*.pyo')
+
+#: Number of bytes inspected when checking whether a file is binary
+BINARY_CHECK_SIZE = 8192
+
+#: Encodings tried in order when decoding a file. Latin-1 never fails, so it
+#: is the last resort.
+DEFAULT_ENCODINGS = ('utf-8', locale.getpreferredencoding(False), 'latin-1')
+
+
+def read_text(path, encodings=None, strip=True):
+    """
+    Read file and return its content as a string.
+
+    Args:
+        path:
+            File path.
+        encodings:
+            Sequence of encodings that are tried in order. The first encoding
+            that decodes the file without errors is used.
+        strip (bool):
+            If True, strip whitespace from both ends of the text.
+    """
+
+    with open(path, 'rb') as F:
+        text = _decode(F.read(), encodings)
+    return text.strip() if strip else text
+
+
+def _decode(data, encodings=None):
+    error = None
+    for encoding in encodings or DEFAULT_ENCODINGS:
+        try:
+            return str(data, encoding)
+        except UnicodeDecodeError as ex:
+            error = ex
+    raise error
+
+
+def walk_documents(path, include=('*',), exclude=DEFAULT_EXCLUDE,
+                   max_size=None, recursive=True, binary=False):
+    """
+    Iterate over (name, path) pairs for all files under the given directory.
+
+    Names are paths relative to the given directory, using '/' as separator.
+    Files are visited in sorted order.
+
+    Args:
+        path:
+            Base directory.
+        include:
+            Sequence of glob patterns. Only files whose name or relative path
+            match at least one pattern are included.
+        exclude:
+            Sequence of glob patterns for files and directories that should be
+            skipped. The default skips hidden files and directories (e.g.,
+            .git), __pycache__ and Python bytecode.
+        max_size (int):
+            Files larger than max_size bytes are skipped.
+        recursive (bool):
+            If False, only files directly inside path are considered.
+        binary (bool):
+            If False (default), files with a null byte in their first
+            BINARY_CHECK_SIZE bytes are considered binary and skipped.
+
+    Raises FileNotFoundError or NotADirectoryError immediately (not on
+    iteration) if path is not an existing directory.
+    """
+
+    base = os.path.abspath(path)
+    if not os.path.exists(base):
+        raise FileNotFoundError('no such directory: %r' % path)
+    if not os.path.isdir(base):
+        raise NotADirectoryError('not a directory: %r' % path)
+    return _walk_documents(base, include, exclude, max_size, recursive,
+                           binary)
+
+
+def _walk_documents(base, include, exclude, max_size, recursive, binary):
+    """
+    Implements walk_documents() for a validated base directory.
+    """
+
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+
+    def matches(name, patterns):
+        base = name.rsplit('/', 1)[-1]
+        return any(fnmatch.fnmatch(name, pattern) or
+                   fnmatch.fnmatch(base, pattern) for pattern in patterns)
+
+    for root, dirs, files in os.walk(base):
+        prefix = os.path.relpath(root, base).replace(os.sep, '/')
+        prefix = '' if prefix == '.' else prefix + '/'
+        if recursive:
+            dirs[:] = sorted(d for d in dirs
+                             if not matches(prefix + d, exclude))
+        else:
+            dirs[:] = []
+
+        for file in sorted(files):
+            name = prefix + file
+            full_path = os.path.join(root, file)
+            if not os.path.isfile(full_path):
+                continue
+            if not matches(name, include) or matches(name, exclude):
+                continue
+            if max_size is not None and os.path.getsize(full_path) > max_size:
+                continue
+            if not binary and is_binary(full_path):
+                continue
+            yield name, full_path
+
+
+def is_binary(path):
+    """
+    Return True if the beginning of the file contains a null byte.
+    """
+
+    with open(path, 'rb') as F:
+        return b'\0' in F.read(BINARY_CHECK_SIZE)
+
+
+class LazyDocument:
+    """
+    A handle to a document stored in a file.
+
+    Text is only read when requested. The text property caches the content
+    until release() is called, while read() never stores it.
+    Only the path is pickled, so handles are cheap to send to other processes.
+    """
+
+    __slots__ = ('path', 'name', 'encodings', '_text')
+
+    def __init__(self, path, name=None, encodings=None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.encodings = encodings
+        self._text = None
+
+    def __repr__(self):
+        return 'LazyDocument(%r)' % self.name
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        # Size in bytes, which approximates the text size without reading it
+        if self._text is not None:
+            return len(self._text)
+        return os.path.getsize(self.path)
+
+    def __getstate__(self):
+        return self.path, self.name, self.encodings
+
+    def __setstate__(self, state):
+        self.path, self.name, self.encodings = state
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        Document content.
+        """
+
+        if self._text is None:
+            self._text = self.read()
+        return self._text
+
+    def read(self):
+        """
+        Read text from file without caching it.
+        """
+
+        if self._text is not None:
+            return self._text
+        return read_text(self.path, self.encodings)
+
+    def release(self):
+        """
+        Discard the cached text.
+        """
+
+        self._text = None
@@ -1,5 +1,8 @@
 from math import sqrt
 
+import numpy as np
+from scipy import sparse as sp_sparse
+
 
 def cos_angle(u, v):
     """
@@ -45,6 +48,230 @@ def similarity(u, v, method=None, norm=None):
         raise ValueError('invalid similarity method: %r' % method)
 
 
+def row_norms(data, norm=None):
+    """
+    Return an array with the norm of each row of a dense or sparse matrix.
+    """
+
+    norm = NORM_MAP.get(norm, norm)
+    if sp_sparse.issparse(data):
+        if norm is norm_l1:
+            values = abs(data).sum(axis=1)
+        elif norm is norm_l2:
+            values = np.sqrt(data.multiply(data).sum(axis=1))
+        else:
+            raise ValueError('unsupported norm for sparse data: %r' % norm)
+        return np.asarray(values, dtype=float).ravel()
+
+    data = np.asarray(data, dtype=float)
+    if norm is norm_l1:
+        return abs(data).sum(axis=1)
+    elif norm is norm_l2:
+        return np.sqrt((data * data).sum(axis=1))
+    return np.array([norm(u) for u in data], dtype=float)
+
+
+def similarity_block(a, b, method=None, norm=None, norms_a=None,
+                     norms_b=None):
+    """
+    Return a len(a) x len(b) array with the similarity between all rows of a
+    and all rows of b.
+
+    It computes the same values as similarity(), but evaluates all pairs in a
+    block at once. Matrices can be dense arrays or scipy.sparse matrices.
+
+    Args:
+        a, b:
+            Two matrices with the same number of columns.
+        method, norm:
+            Similarity method and norm, as in similarity().
+        norms_a, norms_b:
+            Optional precomputed row norms of a and b. Angle similarity always
+            uses the L2 norm.
+    """
+
+    norm = NORM_MAP.get(norm, norm)
+    method = METHOD_MAP.get(method, method)
+    if method == 'angle':
+        norm = norm_l2
+    elif method != 'triangular':
+        raise ValueError('invalid similarity method: %r' % method)
+    if norm is not norm_l1 and norm is not norm_l2:
+        return _similarity_block_loop(a, b, method, norm)
+
+    if norms_a is None:
+        norms_a = row_norms(a, norm)
+    if norms_b is None:
+        norms_b = row_norms(b, norm)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'angle':
+            cos = _dot_block(a, b) / np.outer(norms_a, norms_b)
+            return (cos + 1) / 2
+
+        if norm is norm_l1:
+            dist = l1_distance_block(a, b, norms_a, norms_b)
+        else:
+            dist = l2_distance_block(a, b, norms_a, norms_b)
+        total = norms_a[:, None] + norms_b[None, :]
+        return np.where(total == 0, 1.0, 1 - dist / total)
+
+
+def similarity_pairs(data, rows, cols, method=None, norm=None, chunk=4096):
+    """
+    Return an array with the similarity between data[rows[k]] and
+    data[cols[k]] for each k.
+
+    Pairs are evaluated in chunks, so this is suitable to score a sparse list
+    of candidate pairs without computing the full similarity matrix.
+    """
+
+    norm = NORM_MAP.get(norm, norm)
+    method = METHOD_MAP.get(method, method)
+    if method == 'angle':
+        norm = norm_l2
+    elif method != 'triangular':
+        raise ValueError('invalid similarity method: %r' % method)
+
+    rows = np.asarray(rows, dtype=int)
+    cols = np.asarray(cols, dtype=int)
+    if norm is not norm_l1 and norm is not norm_l2:
+        getrow = (lambda i: data[i].toarray().ravel()) \
+            if sp_sparse.issparse(data) else (lambda i: data[i])
+        return np.array([similarity(getrow(i), getrow(j), method, norm=norm)
+                         for i, j in zip(rows, cols)], dtype=float)
+
+    if sp_sparse.issparse(data):
+        data = data.tocsr()
+    norms = row_norms(data, norm)
+    result = np.empty(len(rows), dtype=float)
+    for start in range(0, len(rows), chunk):
+        i, j = rows[start:start + chunk], cols[start:start + chunk]
+        a, b = data[i], data[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if method == 'angle':
+                dot = _row_sum(a.multiply(b) if sp_sparse.issparse(a)
+                               else a * b)
+                cos = dot / (norms[i] * norms[j])
+                result[start:start + chunk] = (cos + 1) / 2
+                continue
+            diff = a - b
+            if norm is norm_l1:
+                dist = _row_sum(abs(diff))
+            else:
+                sq = diff.multiply(diff) if sp_sparse.issparse(diff) \
+                    else diff * diff
+                dist = np.sqrt(_row_sum(sq))
+            total = norms[i] + norms[j]
+            result[start:start + chunk] = \
+                np.where(total == 0, 1.0, 1 - dist / total)
+    return result
+
+
+def _row_sum(data):
+    """
+    Sum of each row of a dense or sparse matrix as a flat array.
+    """
+
+    return np.asarray(data.sum(axis=1), dtype=float).ravel()
+
+
+def _dot_block(a, b):
+    """
+    Dense array of dot products between rows of a and rows of b.
+    """
+
+    result = a @ b.T
+    if sp_sparse.issparse(result):
+        return result.toarray()
+    return np.asarray(result, dtype=float)
+
+
+def l1_distance_block(a, b, norms_a=None, norms_b=None):
+    """
+    Dense array of L1 distances between rows of a and rows of b.
+
+    Optional norms_a and norms_b are the precomputed L1 norms of the rows of
+    a and b.
+    """
+
+    if norms_a is None:
+        norms_a = row_norms(a, norm_l1)
+    if norms_b is None:
+        norms_b = row_norms(b, norm_l1)
+
+    result = np.empty((a.shape[0], b.shape[0]), dtype=float)
+    if not sp_sparse.issparse(a) and not sp_sparse.issparse(b):
+        b = np.asarray(b, dtype=float)
+        for i, u in enumerate(np.asarray(a, dtype=float)):
+            result[i] = abs(b - u).sum(axis=1)
+        return result
+
+    # For sparse data, only the columns in the support of u need to be
+    # inspected: |u - v| = |u| + |v| - sum_S(|u_k| + |v_k| - |u_k - v_k|)
+    a = sp_sparse.csr_matrix(a)
+    b = sp_sparse.csc_matrix(b)
+    for i in range(a.shape[0]):
+        start, end = a.indptr[i], a.indptr[i + 1]
+        cols = a.indices[start:end]
+        u = a.data[start:end]
+        v = b[:, cols].toarray()
+        shared = (abs(u) + abs(v) - abs(v - u)).sum(axis=1)
+        result[i] = norms_a[i] + norms_b - shared
+    return result
+
+
+def l2_distance_block(a, b, norms_a=None, norms_b=None):
+    """
+    Dense array of L2 distances between rows of a and rows of b.
+
+    Optional norms_a and norms_b are the precomputed L2 norms of the rows of
+    a and b.
+    """
+
+    if norms_a is None:
+        norms_a = row_norms(a, norm_l2)
+    if norms_b is None:
+        norms_b = row_norms(b, norm_l2)
+
+    # |u - v|^2 = |u|^2 + |v|^2 - 2 u.v loses all precision when u and v are
+    # nearly equal. These pairs are computed again from the differences.
+    scale = norms_a[:, None] ** 2 + norms_b[None, :] ** 2
+    result = scale - 2 * _dot_block(a, b)
+    np.maximum(result, 0, out=result)
+    rows, cols = np.nonzero(result <= L2_CANCELLATION_TOL * scale)
+    if len(rows):
+        if sp_sparse.issparse(a):
+            a = a.tocsr()
+        if sp_sparse.issparse(b):
+            b = b.tocsr()
+        diff = a[rows] - b[cols]
+        sq = diff.multiply(diff) if sp_sparse.issparse(diff) \
+            else diff * diff
+        result[rows, cols] = _row_sum(sq)
+    return np.sqrt(result)
+
+
+def _similarity_block_loop(a, b, method, norm):
+    """
+    Fallback for similarity_block() with user defined norm functions.
+    """
+
+    if sp_sparse.issparse(a):
+        a = a.toarray()
+    if sp_sparse.issparse(b):
+        b = b.toarray()
+    result = np.empty((a.shape[0], b.shape[0]), dtype=float)
+    for i, u in enumerate(a):
+        for j, v in enumerate(b):
+            result[i, j] = similarity(u, v, method, norm=norm)
+    return result
+
+
+#: Relative size of the squared L2 distances that l2_distance_block()
+#: computes again from the differences of rows
+L2_CANCELLATION_TOL = 1e-8
+
 METHOD_MAP = {
     None: 'triangular',
 }
@@ -57,4 +284,28 @@ NORM_MAP = {
     'l2': norm_l2,
     'L2': norm_l2,
     'euclidean': norm_l2,
-}
\ No newline at end of file
+}
+
+
+def column_std(data, chunk=4096):
+    """
+    Standard deviation of each column of a dense, memory-mapped or sparse
+    matrix.
+    """
+
+    if isinstance(data, np.memmap):
+        # Accumulate in chunks to avoid loading the whole file at once
+        total = np.zeros(data.shape[1])
+        total_sq = np.zeros(data.shape[1])
+        for start in range(0, data.shape[0], chunk):
+            rows = np.array(data[start:start + chunk], dtype=float)
+            total += rows.sum(axis=0)
+            total_sq += (rows ** 2).sum(axis=0)
+        mean = total / max(data.shape[0], 1)
+        mean_sq = total_sq / max(data.shape[0], 1)
+        return np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
+    if not sp_sparse.issparse(data):
+        return data.std(axis=0)
+    mean = np.asarray(data.mean(axis=0)).ravel()
+    mean_sq = np.asarray(data.multiply(data).mean(axis=0)).ravel()
+    return np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
@@ -0,0 +1,148 @@
+"""
+MinHash signatures and banded locality sensitive hashing (LSH).
+
+These are used to select candidate pairs of documents with a high Jaccard
+similarity between their token sets before computing the exact similarity
+only for those pairs.
+"""
+
+import numpy as np
+
+from plagiarism.utils import stable_hash, is_id_array
+
+__all__ = [
+    'minhash_signatures', 'lsh_candidates', 'lsh_probability', 'lsh_recall',
+    'jaccard_estimate',
+]
+
+#: Mersenne prime used in the universal hash family. Token hashes have 32 bits
+#: so a * x + b never overflows an uint64.
+PRIME = (1 << 31) - 1
+
+
+def minhash_signatures(documents, num_perm=128, seed=0):
+    """
+    Compute the MinHash signature of each document.
+
+    Args:
+        documents:
+            A list of documents. Each document is a sequence of tokens (or
+            n-grams) or an array of token ids and is treated as a set.
+        num_perm (int):
+            Number of hash functions/permutations in each signature.
+        seed (int):
+            Seed used to draw the hash functions.
+
+    Returns:
+        A (len(documents) x num_perm) uint64 array. Empty documents have all
+        their values equal to PRIME.
+    """
+
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, PRIME, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, PRIME, size=num_perm).astype(np.uint64)
+    prime = np.uint64(PRIME)
+
+    result = np.full((len(documents), num_perm), PRIME, dtype=np.uint64)
+    for idx, doc in enumerate(documents):
+        if is_id_array(doc):
+            # Token ids are already small integers
+            hashes = np.unique(doc).astype(np.uint64) % prime
+            if not len(hashes):
+                continue
+        else:
+            tokens = set(doc)
+            if not tokens:
+                continue
+            hashes = np.fromiter((stable_hash(tok, 32) for tok in tokens),
+                                 dtype=np.uint64, count=len(tokens))
+        hashed = (a[:, None] * hashes[None, :] + b[:, None]) % prime
+        result[idx] = hashed.min(axis=1)
+    return result
+
+
+def lsh_candidates(signatures, bands=16, rows=None):
+    """
+    Return the candidate pairs of documents that share at least one band of
+    their MinHash signatures.
+
+    Args:
+        signatures:
+            Output of minhash_signatures().
+        bands (int):
+            Number of bands.
+        rows (int):
+            Number of signature values in each band. Defaults to the largest
+            value such that bands * rows fits in the signature.
+
+    Returns:
+        A sorted (size x 2) int array with unique (i, j) pairs, i < j.
+    """
+
+    size, num_perm = signatures.shape
+    if rows is None:
+        rows = num_perm // bands
+    if bands * rows > num_perm or rows < 1:
+        raise ValueError('cannot fit %s bands of %s rows in a signature of '
+                         'size %s' % (bands, rows, num_perm))
+
+    pairs = []
+    for band in range(bands):
+        keys = signatures[:, band * rows:(band + 1) * rows]
+        _, labels = np.unique(keys, axis=0, return_inverse=True)
+        labels = labels.ravel()
+        order = np.argsort(labels, kind='stable')
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        for bucket in np.split(order, bounds):
+            if len(bucket) > 1:
+                i, j = np.triu_indices(len(bucket), k=1)
+                pairs.append(np.stack([bucket[i], bucket[j]], axis=1))
+
+    if not pairs:
+        return np.zeros((0, 2), dtype=int)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def lsh_probability(similarity, bands, rows):
+    """
+    Probability that two documents with the given Jaccard similarity become
+    a candidate pair.
+    """
+
+    return 1 - (1 - np.asarray(similarity) ** rows) ** bands
+
+
+def jaccard_estimate(signatures, i, j):
+    """
+    Estimate the Jaccard similarity between documents i and j from their
+    MinHash signatures.
+    """
+
+    return float((signatures[i] == signatures[j]).mean())
+
+
+def lsh_recall(candidates, similarity, threshold):
+    """
+    Fraction of the pairs with exact similarity above threshold that were
+    selected as candidates.
+
+    Args:
+        candidates:
+            Output of lsh_candidates().
+        similarity:
+            Exact (dense) similarity matrix.
+        threshold:
+            Minimum similarity of the pairs that should be found.
+
+    Returns:
+        The recall, or 1.0 if no pair reaches the threshold.
+    """
+
+    similarity = np.asarray(similarity)
+    i, j = np.nonzero(np.triu(similarity >= threshold, k=1))
+    if not len(i):
+        return 1.0
+    found = set(map(tuple, np.asarray(candidates).tolist()))
+    hits = sum((a, b) in found for a, b in zip(i.tolist(), j.tolist()))
+    return hits / len(i)
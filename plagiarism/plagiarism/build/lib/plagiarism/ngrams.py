@@ -1,6 +1,12 @@
 import collections
 
-from plagiarism.utils import count_all
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from plagiarism.utils import count_all, stable_hash, is_id_array
+
+#: Odd multiplier of the polynomial n-gram hash (arithmetic is mod 2**64)
+HASH_BASE = np.uint64(0x100000001b3)
 
 
 def remove_ngram(words, ngram):
@@ -47,7 +53,12 @@ def optimal_bigrams(documents, iter=1, **kwargs):
             String separator for joining to words in a bi-gram.
         join (callable):
             Function used to join a tuple of words into a bi-gram. If you
-            want to preserve bi-gram as a tuple, use ``join=tuple``.
+            want to preserve bi-gram as a tuple, use ``join=tuple``. It is
+            required for documents of integer ids, which cannot be joined by
+            sep (see plagiarism.vocabulary.Vocabulary.join()). With ids from a
+            sorted vocabulary, a single iteration selects the same bi-grams
+            as the string tokens. Ids of joined bi-grams are appended in
+            creation order, so later iterations may select different ones.
         predictable:
             If True (default), take precautions to make the optimal list to be
             predicable over different runs.
@@ -66,6 +77,9 @@ def optimal_bigrams(documents, iter=1, **kwargs):
     # Parameters
     sep = kwargs.get('sep', ' ')
     join = kwargs.get('join', None)
+    if join is None and any(map(is_id_array, documents)):
+        raise ValueError('documents of integer ids require a join function, '
+                         'e.g., join=tuple or join=vocabulary.join')
     if join is None:
         def join(x):
             return sep.join(x)
@@ -74,9 +88,7 @@ def optimal_bigrams(documents, iter=1, **kwargs):
     allow_superposition = kwargs.get('allow_superposition', False)
 
     # Select bi-grams
-    bigrams = ngrams_all(documents, 2, join=tuple)
-    bi_counter = count_all(bigrams)
-    uni_counter = count_all(documents)
+    uni_counter, bi_counter = _count_pairs(documents)
     if not uni_counter:
         raise ValueError('documents are empty: %r' % documents)
 
@@ -97,64 +109,167 @@ def optimal_bigrams(documents, iter=1, **kwargs):
             return [list(doc) for doc in documents]
         raise StopIteration
 
-    # Iterate the list of most frequent pairs skipping possible collisions
-    # Return early if bi_counter has no elements
-    has_skip = True
-    result = [list(doc) for doc in documents]
-    while has_skip:
-        candidates = []
-        words_in_bigrams = set()
-        has_skip = False
-        most_common = bi_counter.most_common()
-        if predictable:
-            most_common.sort(key=lambda x: x[::-1])
-        for (w1, w2), n in most_common:
-            if w1 in words_in_bigrams or w2 in words_in_bigrams:
-                has_skip = True
-                if not allow_superposition:
-                    continue
-            words_in_bigrams.add(w1)
-            words_in_bigrams.add(w2)
-            candidates.append((w1, w2))
+    # Pair counts do not change while documents are rewritten, hence the
+    # rounds of non-colliding pairs can be computed in advance
+    most_common = bi_counter.most_common()
+    if predictable:
+        most_common.sort(key=lambda x: x[::-1])
+    rounds = _merge_rounds([pair for pair, _ in most_common],
+                           allow_superposition)
+
+    # Index documents by the selected pairs they contain, so each round only
+    # rewrites the documents that have one of its pairs
+    result = [_as_list(doc) for doc in documents]
+    pending = {pair: r for r, pairs in enumerate(rounds) for pair in pairs}
+    index = collections.defaultdict(set)
+    for idx, doc in enumerate(result):
+        for pair in zip(doc, doc[1:]):
+            if pair in pending:
+                index[pair].add(idx)
+
+    for candidates in rounds:
         candidates = set(candidates)
-
-        # Remove used pairs
+        words_in_bigrams = {word for pair in candidates for word in pair}
+        affected = set()
         for pair in candidates:
-            del bi_counter[pair]
-
-        # Recalculate list of bi-grams and uni-grams
-        new_result = []
-        for doc in result:
-            new_doc = []
-            extra = []
-            last_idx = len(doc) - 1
-            skip = False
-            for i, word in enumerate(doc):
-                if skip:
-                    skip = False
-                    continue
-                elif i == last_idx:
-                    new_doc.append(word)
-                    break
-                elif word in words_in_bigrams:
-                    pair = (word, doc[i + 1])
-                    if pair in candidates:
-                        if accumulate:
-                            extra.extend(pair)
-                        new_doc.append(join(pair))
-                        skip = True
-                    else:
-                        new_doc.append(word)
-                else:
-                    new_doc.append(word)
-            new_doc.extend(extra)
-            new_result.append(new_doc)
-        result = new_result
-
+            del pending[pair]
+            affected.update(index.pop(pair, ()))
+        for idx in affected:
+            doc = _merge_pairs(result[idx], candidates, words_in_bigrams,
+                               join, accumulate)
+            result[idx] = doc
+            for pair in zip(doc, doc[1:]):
+                if pair in pending:
+                    index[pair].add(idx)
     return result
 
 
-def ngrams(document, n, sep=' ', join=None, accumulate=False):
+def _count_pairs(documents):
+    """
+    Return counters of unigrams and bigrams (as tuples) of all documents.
+
+    Keys are inserted in order of first occurrence. Documents given as
+    integer arrays are counted in a vectorized way using exact 64 bit codes
+    for each pair of token ids. When the range of ids is too large for these
+    codes (e.g., hashed n-grams), the rows of (a, b) pairs are counted
+    instead.
+    """
+
+    is_array = [isinstance(doc, np.ndarray) and doc.dtype.kind in 'iu'
+                for doc in documents]
+    dtype = np.result_type(*documents) if documents and all(is_array) \
+        else None
+    if dtype is None or dtype.kind not in 'iu':
+        # Mixing int64 and uint64 arrays has no common integer type
+        bi_counter = collections.Counter()
+        for doc in documents:
+            doc = _as_list(doc)
+            bi_counter.update(zip(doc, doc[1:]))
+        return count_all(documents), bi_counter
+
+    ids = np.concatenate([doc.astype(dtype) for doc in documents])
+    if not len(ids):
+        return collections.Counter(), collections.Counter()
+    uni_counter = _ordered_counts(ids)
+    bi_counter = collections.Counter()
+    offset = int(ids.min())
+    size = int(ids.max()) - offset + 1
+    if size * size <= np.iinfo(np.int64).max:
+        codes = [(doc[:-1].astype(np.int64) - offset) * size +
+                 (doc[1:].astype(np.int64) - offset) for doc in documents]
+        for code, n in _ordered_counts(np.concatenate(codes)).items():
+            pair = divmod(code, size)
+            bi_counter[pair[0] + offset, pair[1] + offset] = n
+        return uni_counter, bi_counter
+
+    pairs = np.concatenate([
+        np.stack([doc[:-1], doc[1:]], axis=1).astype(dtype)
+        for doc in documents])
+    unique, first, counts = np.unique(pairs, axis=0, return_index=True,
+                                      return_counts=True)
+    order = np.argsort(first, kind='stable')
+    for (a, b), n in zip(unique[order].tolist(), counts[order].tolist()):
+        bi_counter[a, b] = n
+    return uni_counter, bi_counter
+
+
+def _ordered_counts(values):
+    """
+    Counter of the values of an array, in order of first occurrence.
+    """
+
+    unique, first, counts = np.unique(values, return_index=True,
+                                      return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return collections.Counter(dict(zip(unique[order].tolist(),
+                                        counts[order].tolist())))
+
+
+def _as_list(doc):
+    return doc.tolist() if isinstance(doc, np.ndarray) else list(doc)
+
+
+def _merge_rounds(pairs, allow_superposition=False):
+    """
+    Split a list of pairs in rounds of pairs that can be merged together.
+
+    Pairs are scanned in order and each round takes all remaining pairs that
+    do not share a word with a pair already taken in the same round. A pair
+    therefore goes to the first round in which both of its words are free.
+    If allow_superposition is True, all pairs are merged in a single round.
+    """
+
+    if allow_superposition:
+        return [list(pairs)]
+
+    rounds = []
+    taken = collections.defaultdict(set)  # word -> rounds that use it
+    for w1, w2 in pairs:
+        used1, used2 = taken[w1], taken[w2]
+        r = 0
+        while r in used1 or r in used2:
+            r += 1
+        used1.add(r)
+        used2.add(r)
+        if r == len(rounds):
+            rounds.append([])
+        rounds[r].append((w1, w2))
+    return rounds
+
+
+def _merge_pairs(doc, candidates, words_in_bigrams, join, accumulate):
+    """
+    Replace occurrences of the candidate pairs in doc by their joined
+    bi-grams, scanning from left to right.
+    """
+
+    new_doc = []
+    extra = []
+    last_idx = len(doc) - 1
+    skip = False
+    for i, word in enumerate(doc):
+        if skip:
+            skip = False
+            continue
+        elif i == last_idx:
+            new_doc.append(word)
+            break
+        elif word in words_in_bigrams:
+            pair = (word, doc[i + 1])
+            if pair in candidates:
+                if accumulate:
+                    extra.extend(pair)
+                new_doc.append(join(pair))
+                skip = True
+            else:
+                new_doc.append(word)
+        else:
+            new_doc.append(word)
+    new_doc.extend(extra)
+    return new_doc
+
+
+def ngrams(document, n, sep=' ', join=None, accumulate=False, hashed=False):
     """
     Create list of n-grams from given sequence of words.
 
@@ -168,12 +283,17 @@ def ngrams(document, n, sep=' ', join=None, accumulate=False):
             you want to represent n-grams by tuples, pass ``join=tuple``.
         accumulate:
             If True, all n-grams lists up to the given n.
+        hashed:
+            If True, return an array of 64 bit n-gram hashes instead of
+            n-gram objects. See ngram_hashes().
 
     Example:
         >>> ngrams(['to', 'be', 'or', 'not', 'to', 'be'], 3, sep=' ')
         ['to be or', 'be or not', 'or not to', 'not to be']
     """
 
+    if hashed:
+        return ngram_hashes(document, n, accumulate=accumulate)
     if join is None:
         def join(x):
             values = map(str, x)
@@ -201,11 +321,85 @@ def _ngrams_acc(words, n, sep=None, join=None):
     """
 
     result = list(words)
-    for i in range(2, n):
+    for i in range(2, n + 1):
         result.extend(ngrams(words, i, sep, join))
     return result
 
 
+def ngram_hashes(document, n, accumulate=False):
+    """
+    Return an uint64 array with the hashes of all n-grams of a document.
+
+    Hashes are computed with a polynomial hash over all windows of the token
+    ids at once, so no intermediate n-gram objects are created. The same
+    n-gram always has the same hash, in any document or process.
+
+    Args:
+        document:
+            An array of integer token ids or a sequence of tokens. Tokens
+            other than integers are converted to ids by stable_hash().
+        n (int):
+            Size of n-grams.
+        accumulate (bool):
+            If True, concatenate hashes of all n-grams of sizes 1 to n.
+
+    Examples:
+        >>> h = ngram_hashes([1, 2, 3, 1, 2], 2)
+        >>> len(h), h[0] == h[3]
+        (4, True)
+    """
+
+    ids = token_ids(document)
+    if accumulate:
+        parts = [_window_hashes(ids, i) for i in range(1, n + 1)]
+        return np.concatenate(parts)
+    return _window_hashes(ids, n)
+
+
+def token_ids(document):
+    """
+    Return document as an uint64 array of token ids.
+
+    Integer arrays are returned as is, other tokens are hashed with
+    stable_hash().
+    """
+
+    if isinstance(document, np.ndarray) and document.dtype.kind in 'iu':
+        return document.astype(np.uint64, copy=False)
+    document = list(document)
+    if all(isinstance(tok, (int, np.integer)) for tok in document):
+        return np.array(document, dtype=np.int64).astype(np.uint64)
+    ids = {}
+    for tok in document:
+        if tok not in ids:
+            ids[tok] = stable_hash(tok)
+    return np.fromiter(map(ids.__getitem__, document), dtype=np.uint64,
+                       count=len(document))
+
+
+def _window_hashes(ids, n):
+    if n < 1 or len(ids) < n:
+        return np.zeros(0, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        powers = np.cumprod(np.full(n, HASH_BASE, dtype=np.uint64))[::-1]
+        windows = sliding_window_view(_mix(ids), n)
+        return _mix(windows @ powers + np.uint64(n))
+
+
+def _mix(values):
+    """
+    Splitmix64 finalizer. Spreads the bits of consecutive ids so that small
+    integers do not produce colliding polynomial hashes.
+    """
+
+    with np.errstate(over='ignore'):
+        values = values ^ (values >> np.uint64(30))
+        values = values * np.uint64(0xbf58476d1ce4e5b9)
+        values = values ^ (values >> np.uint64(27))
+        values = values * np.uint64(0x94d049bb133111eb)
+        return values ^ (values >> np.uint64(31))
+
+
 def ngrams_all(documents, *args, **kwargs):
     """
     Like ngrams() function, but expects a list of documents.
@@ -214,5 +408,3 @@ def ngrams_all(documents, *args, **kwargs):
     """
 
     return [ngrams(doc, *args, **kwargs) for doc in documents]
-
-
@@ -2,104 +2,208 @@
 A prepared set of tasks.
 """
 import collections
+import collections.abc
 import os
 import sys
 
-from plagiarism.bag_of_words import vectorize, similarity_matrix, \
-    bag_of_documents, most_similar
+import numpy as np
+
+from plagiarism.bag_of_words import similarity_matrix, most_similar, \
+    pairs_similarity_matrix
+from plagiarism.cache import get_cache
+from plagiarism.corpus import CorpusStatistics
 from plagiarism.input import ask, yn_input, do_print, no_print, clear
+from plagiarism.loader import LazyDocument, walk_documents, \
+    DEFAULT_EXCLUDE
+from plagiarism.minhash import minhash_signatures, lsh_candidates
 from plagiarism.ngrams import optimal_bigrams
 from plagiarism.text import text_diff, two_column
-from plagiarism.tokenizers import tokenize_all
-from plagiarism.utils import tokens_all, timeit
+from plagiarism.tokenizers import tokenize_all, tokenizer_name
+from plagiarism.utils import timeit
+from plagiarism.vocabulary import Vocabulary, ID_DTYPE
 
 suspect_result = collections.namedtuple('SuspectResult',
     field_names=['documents', 'similar_pairs', 'similarity_matrix', 'tokens']
 )
 
 
-def documents_map(documents=None):
+def documents_map(documents=None, lazy=False, include=('*',),
+                  exclude=DEFAULT_EXCLUDE, max_size=None, recursive=True,
+                  encodings=None):
     """
     Return a dictionary mapping documents to their respective content.
+
+    Args:
+        documents:
+            A mapping from names to documents or a directory path. Files are
+            searched recursively and named by their path relative to the
+            given directory. Defaults to the current working directory.
+        lazy (bool):
+            If True, values are LazyDocument handles that only read the
+            file content on demand.
+        include, exclude, max_size, recursive:
+            Control which files are loaded. Hidden files and directories,
+            caches and binary files are skipped by default. See
+            plagiarism.loader.walk_documents().
+        encodings:
+            Sequence of encodings tried in order when decoding files.
     """
 
     # Use cwd as path if documents is not given.
     if documents is None:
         documents = os.getcwd()
 
-    if isinstance(documents, collections.Mapping):
+    if isinstance(documents, collections.abc.Mapping):
         return collections.OrderedDict(documents)
     if isinstance(documents, str):
-        path = os.path.abspath(documents)
-        files = [os.path.join(path, f) for f in os.listdir(path)]
-        files = [f for f in files if os.path.exists(f) and os.path.isfile(f)]
-        documents = collections.OrderedDict()
-        for f in files:
-            with open(f) as F:
-                documents[os.path.split(f)[1]] = F.read().strip()
-        return documents
+        files = walk_documents(documents, include=include, exclude=exclude,
+                               max_size=max_size, recursive=recursive)
+        result = collections.OrderedDict()
+        for name, path in files:
+            document = LazyDocument(path, name, encodings)
+            result[name] = document if lazy else document.read()
+        return result
     raise NotImplementedError
 
 
 def find_suspects(documents=None, tokenizer='code', verbose=False,
-                  accumulate=False):
+                  accumulate=False, sparse=True, matrix_file=None,
+                  block=256, n=None, threshold=None, lsh=None,
+                  archive=None, jobs=None, cache=None):
     """
     Find documents with the highest suspicion of plagiarism.
 
     Args:
         documents:
             Dictionary mapping document name to its content.
+        sparse (bool):
+            If True (default), documents are represented by a sparse CSR
+            matrix during the similarity computation.
+        matrix_file:
+            If given, the similarity matrix is written to a memory-mapped file
+            with this name instead of being kept in memory. It cannot be used
+            together with lsh, which returns a sparse matrix. The selected
+            pairs are kept in memory (12 bytes each), so n or threshold must
+            be given as well: the list of all pairs would be larger than the
+            matrix itself.
+        block (int):
+            Tile size used to compute the similarity matrix.
+        n (int):
+            Maximum number of similar pairs to return.
+        threshold (float):
+            Minimum similarity of the returned pairs.
+        lsh (tuple):
+            An optional (bands, rows) tuple. If given, MinHash signatures of
+            the n-grams of each document are split in bands and only the
+            pairs that share at least one band are scored. The similarity
+            matrix is then a sparse matrix with only the candidate pairs.
+        archive:
+            An optional plagiarism.archive.Archive instance. Archived
+            documents are compared with the given documents using their
+            stored tokens, so only the new documents are tokenized. Archived
+            documents with the same name as a given document are ignored.
+        jobs (int):
+            Number of worker processes used in the tokenization stage. See
+            plagiarism.tokenizers.tokenize_all().
+        cache:
+            An optional plagiarism.cache.TokenCache instance or directory.
+            Unchanged documents are loaded from the cache instead of being
+            tokenized again.
 
     Returns:
         documents:
             Ordered dictionary mapping document names to documents.
         similar_pairs:
-            List of pairs in decreasing order of similarity.
+            SimilarPairs sequence in decreasing order of similarity.
         similarity_matrix:
             Symmetric matrix with similarity values for the (i, j) documents.
         tokens:
             List of tokens used in the final comparison.
     """
 
+    if lsh is not None and matrix_file is not None:
+        raise ValueError('matrix_file is not supported with lsh')
+    if matrix_file is not None and (n is None or n <= 0) and \
+            threshold is None:
+        raise ValueError('matrix_file requires n or threshold')
     info = do_print if verbose else no_print
 
-    # Find documents
+    # Find documents. Files are read on demand and their content is not kept
+    # after tokenization.
     with timeit() as dt:
-        documents = documents_map(documents)
+        documents = documents_map(documents, lazy=True)
         document_list = list(documents.values())
         info('Processing %s documents (%es).' % (len(documents), dt))
 
     # Tokenize documents
     with timeit() as dt:
-        tokenized = tokenize_all(document_list, tokenizer=tokenizer)
-        tokens = tokens_all(tokenized)
-        info('%s tokens found.' % len(tokens))
+        cache = get_cache(cache)
+        tokenized = tokenize_all(document_list, tokenizer=tokenizer,
+                                 jobs=jobs, cache=cache)
+        if cache is not None:
+            info('Token cache: %s hits, %s misses.' % (cache.hits,
+                                                      cache.misses))
+        if archive is not None:
+            if tokenizer_name(archive.tokenizer) != tokenizer_name(tokenizer):
+                raise ValueError('archive uses a different tokenizer')
+            names = [name for name in archive if name not in documents]
+            tokenized.extend(archive.tokens(name) for name in names)
+            for name in names:
+                documents[name] = archive.document(name)
+            document_list = list(documents.values())
+            info('Loaded %s documents from archive.' % len(names))
+
+        # Documents are stored as arrays of token ids. Ids follow the sorted
+        # order of tokens, hence a single iteration of optimal_bigrams()
+        # selects the same bi-grams as it would for the string tokens. This
+        # does not hold for more iterations, since the ids of joined bi-grams
+        # are not sorted.
+        vocabulary = Vocabulary.from_documents(tokenized)
+        tokenized = vocabulary.encode_all(tokenized, add=False)
+        info('%s tokens found.' % len(vocabulary))
 
     # Creating ngrams
     with dt.update():
         tokenized = optimal_bigrams(tokenized, 1,
                                     accumulate=accumulate,
-                                    allow_superposition=False)
-        tokens = tokens_all(tokenized)
-        info('Using %s unique n-grams. (%es)' % (len(tokens), dt))
+                                    allow_superposition=False,
+                                    join=vocabulary.join)
+        tokenized = [np.asarray(doc, dtype=ID_DTYPE) for doc in tokenized]
 
-    # Bag of words
+    # Bag of words: weighted frequencies are computed directly as a sparse
+    # matrix whose columns are the n-gram ids in increasing order
     with timeit() as dt:
-        bag = bag_of_documents(tokenized, method='weighted')
-        info('Computed bag of words for all documents. (%es)' % dt)
+        stats = CorpusStatistics(tokenized)
+        tokens = stats.tokens
+        data = stats.weighted()
+        data.eliminate_zeros()
+        if not sparse:
+            data = data.toarray()
+        info('Computed bag of words with %s unique n-grams. (%es)'
+             % (len(tokens), dt))
 
     # Computing similarity matrix
     with timeit() as dt:
-        data = vectorize(bag)
-        matrix = similarity_matrix(data, method='triangular', norm='l1')
-        similar = most_similar(document_list, matrix)
-        values = [x.similarity for x in similar]
-        fmt = (min(values), max(values), dt)
-        info('Similarity in the %s-%s range. (%es)' % fmt)
+        if lsh is None:
+            matrix = similarity_matrix(data, method='triangular', norm='l1',
+                                       block=block, filename=matrix_file)
+        else:
+            bands, rows = lsh
+            signatures = minhash_signatures(tokenized, bands * rows)
+            pairs = lsh_candidates(signatures, bands, rows)
+            info('Selected %s candidate pairs with LSH.' % len(pairs))
+            matrix = pairs_similarity_matrix(data, pairs, method='triangular',
+                                             norm='l1')
+        similar = most_similar(document_list, matrix, n=n,
+                               threshold=threshold)
+        values = similar.similarities
+        if len(values):
+            fmt = (values.min(), values.max(), dt)
+            info('Similarity in the %s-%s range. (%es)' % fmt)
 
     return suspect_result(similar_pairs=similar,
                           similarity_matrix=matrix,
-                          tokens=tokens,
+                          tokens=sorted(vocabulary.decode(tokens)),
                           documents=documents)
 
 
@@ -125,7 +229,7 @@ def interactive_find_suspects(documents=None, accumulate=None, show='diff'):
         name1, name2 = doc_names[i], doc_names[j]
         do_print('# %s vs. %s\n' % (name1, name2))
         do_print('Similarity: %.1f%%\n' % (100 * pair.similarity))
-        doc1, doc2 = pair
+        doc1, doc2 = map(str, pair)
         if show == 'diff':
             do_print(text_diff(doc1, doc2))
         elif show == 'twocolumn':
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from plagiarism.archive import Archive, ARCHIVE_VERSION, MANIFEST
+from plagiarism.tasks import find_suspects
+from plagiarism.tokenizers import split_programming_tokens
+
+FIBO = 'def fibo(n):\n    x, y = 1, 1\n    for _ in range(n):\n' \
+       '        x, y = y, x + y\n    return x\n'
+HELLO = 'while True:\n    print("hello world")\n'
+
+
+def test_archive_roundtrip(tmpdir):
+    path = str(tmpdir.join('archive'))
+    archive = Archive(path)
+    archive.add_all({'fibo.py': FIBO, 'hello.py': HELLO})
+    assert not archive.add('fibo.py', FIBO)
+    archive.save()
+
+    archive = Archive(path)
+    assert archive.names == ['fibo.py', 'hello.py']
+    assert archive.tokens('fibo.py') == split_programming_tokens(FIBO)
+    assert archive.counts('fibo.py')['x'] == 4
+    assert archive.text('hello.py') == HELLO
+    assert archive.find(HELLO) == 'hello.py'
+    assert str(archive.document('hello.py')) == HELLO
+    assert len(archive.fingerprints('fibo.py')) > 0
+
+    archive.remove('hello.py')
+    assert 'hello.py' not in archive
+    assert Archive(path).text('hello.py') == HELLO
+    archive.save()
+    assert Archive(path).names == ['fibo.py']
+    assert len(os.listdir(path)) == 2
+
+    with pytest.raises(ValueError):
+        archive.add('null.py', 'x', tokens=['a\0b'])
+
+    with pytest.raises(ValueError):
+        Archive(path, tokenizer='python')
+
+
+def test_find_suspects_with_archive(tmpdir):
+    archive = Archive(str(tmpdir.join('archive')))
+    archive.add('old/fibo.py', FIBO)
+    result = find_suspects({'new.py': FIBO.replace('fibo', 'fib'),
+                            'hello.py': HELLO}, archive=archive)
+    assert list(result.documents) == ['new.py', 'hello.py', 'old/fibo.py']
+    assert result.similar_pairs[0].indexes == (0, 2)
+    assert str(result.similar_pairs[0][1]) == FIBO
+    assert str(result.documents['old/fibo.py']) == FIBO
+    assert repr(result.documents['old/fibo.py']) == \
+        "ArchivedDocument('old/fibo.py')"
+
+
+def test_archive_version(tmpdir):
+    path = str(tmpdir.join('archive'))
+    archive = Archive(path)
+    archive.add('fibo.py', FIBO, tokens=['stale', 'tokens'])
+    archive.save()
+    assert Archive(path).tokens('fibo.py') == ['stale', 'tokens']
+
+    manifest = os.path.join(path, MANIFEST)
+    with open(manifest) as F:
+        data = json.load(F)
+    del data['version']
+    with open(manifest, 'w') as F:
+        json.dump(data, F)
+
+    archive = Archive(path)
+    assert archive.tokens('fibo.py') == split_programming_tokens(FIBO)
+    with open(manifest) as F:
+        assert json.load(F)['version'] == ARCHIVE_VERSION
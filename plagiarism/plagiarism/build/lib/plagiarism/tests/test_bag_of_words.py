@@ -1,5 +1,10 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
 from plagiarism.bag_of_words import bag_of_words, bag_of_documents, vectorize, \
-    similarity_matrix, most_similar, common_tokens_all
+    similarity_matrix, most_similar, common_tokens_all, load_similarity_matrix, \
+    PAIR_DTYPE
 from plagiarism.ngrams import optimal_bigrams
 from plagiarism.text import text_diff
 from plagiarism.tokenizers import split_python_tokens, tokenize_all
@@ -31,4 +36,79 @@ def test_common_tokens(fibo_docs):
     f = lambda x: sorted([y[0] for y in x])
     assert f(common_tokens_all(toks, 3)) == ['n', 'x', 'y']
     assert set(f(common_tokens_all(toks, 10, by_document=True)))\
-        .issuperset(['def', 'n', 'return'])
\ No newline at end of file
+        .issuperset(['def', 'n', 'return'])
+
+def test_sparse_vectorize(tokens):
+    docs = [tokens, tokens[:3], tokens[2:] + tokens[2:]]
+    bag = bag_of_documents(docs, method='count')
+    dense = vectorize(bag)
+    sparse = vectorize(bag, sparse=True)
+    assert sparse.shape == dense.shape
+    assert (sparse.toarray() == dense).all()
+
+
+def test_sparse_similarity_matrix(tokens):
+    docs = [tokens, tokens[:3], tokens[2:] + tokens[2:], tokens[::2]]
+    bag = bag_of_documents(docs, method='count')
+    dense = similarity_matrix(vectorize(bag))
+    sparse = similarity_matrix(vectorize(bag, sparse=True))
+    assert abs(dense - sparse).max() < 1e-12
+
+    pairs = most_similar(docs, csr_matrix(dense))
+    assert [p.indexes for p in pairs] == \
+        [p.indexes for p in most_similar(docs, dense)]
+
+
+def test_tiled_similarity_matrix(tokens, tmpdir):
+    docs = [tokens, tokens[:3], tokens[2:] + tokens[2:], tokens[::2],
+            tokens[1:4], tokens[::-1]]
+    data = vectorize(bag_of_documents(docs, method='count'), sparse=True)
+    expected = similarity_matrix(data)
+
+    path = str(tmpdir.join('matrix.dat'))
+    result = similarity_matrix(data, block=4, filename=path)
+    assert abs(result - expected).max() < 1e-12
+
+    loaded = load_similarity_matrix(path)
+    assert loaded.shape == expected.shape
+    assert [p.indexes for p in most_similar(docs, loaded)] == \
+        [p.indexes for p in most_similar(docs, expected)]
+
+
+def test_find_suspects_matrix_file(tmpdir):
+    from plagiarism.tasks import find_suspects
+
+    docs = {'a': 'x = 1 + 2', 'b': 'x = 1 + 3', 'c': 'def f(): pass'}
+    path = str(tmpdir.join('matrix.dat'))
+    with pytest.raises(ValueError):
+        find_suspects(docs, matrix_file=path)
+    with pytest.raises(ValueError):
+        find_suspects(docs, matrix_file=path, n=0)
+    result = find_suspects(docs, matrix_file=path, n=2)
+    assert list(result.similar_pairs) == \
+        list(find_suspects(docs).similar_pairs)[:2]
+    assert result.similar_pairs.pairs.dtype == PAIR_DTYPE
+
+
+def test_most_similar_top_k():
+    docs = ['a', 'b', 'c', 'd']
+    M = np.array([[1.0, 0.2, 0.9, 0.4],
+                  [0.2, 1.0, 0.5, 0.9],
+                  [0.9, 0.5, 1.0, 0.1],
+                  [0.4, 0.9, 0.1, 1.0]])
+    pairs = most_similar(docs, M)
+    assert len(pairs) == 6
+    assert [p.indexes for p in pairs[:3]] == [(1, 3), (0, 2), (1, 2)]
+
+    top = most_similar(docs, M, 2)
+    assert [p.indexes for p in top] == [(1, 3), (0, 2)]
+    assert top[0] == ('b', 'd')
+    assert abs(top[0].similarity - 0.9) < 1e-6
+
+    above = most_similar(docs, M, threshold=0.4)
+    assert len(above) == 4
+    assert [p.indexes for p in most_similar(docs, csr_matrix(M), 3)] == \
+        [p.indexes for p in pairs[:3]]
+
+    unbounded = most_similar(docs, M, n=0)
+    assert [p.indexes for p in unbounded] == [p.indexes for p in pairs]
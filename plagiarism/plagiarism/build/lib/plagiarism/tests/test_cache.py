@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from plagiarism import cache as cache_module
+from plagiarism.cache import TokenCache, LOW_WATER
+from plagiarism.tasks import find_suspects
+from plagiarism.tokenizers import tokenize_all
+
+DOCS = ['foo = bar + 1', 'print("hello world")', '']
+
+
+def test_cache_roundtrip(tmpdir):
+    cache = TokenCache(str(tmpdir))
+    key = cache.key('some text', 'tokenizer')
+    assert cache.get(key) is None
+    assert cache.put(key, ['some', 'text'])
+    assert cache.get(key) == ['some', 'text']
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert key != cache.key('some text', 'other tokenizer')
+    assert not cache.put(key, [('not', 'str')])
+    assert len(TokenCache(str(tmpdir))) == 1
+
+
+def test_cache_key_version(tmpdir, monkeypatch):
+    cache = TokenCache(str(tmpdir))
+    key = cache.key('some text', 'tokenizer')
+    monkeypatch.setattr(cache_module, 'CACHE_VERSION',
+                        cache_module.CACHE_VERSION + 1)
+    assert cache.key('some text', 'tokenizer') != key
+
+
+def test_tokenize_all_with_cache(tmpdir):
+    cache = TokenCache(str(tmpdir))
+    expected = tokenize_all(DOCS, 'code')
+    assert tokenize_all(DOCS, 'code', cache=cache) == expected
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert tokenize_all(DOCS, 'code', cache=cache) == expected
+    assert (cache.hits, cache.misses) == (3, 3)
+
+    # Different tokenizers do not share entries
+    tokenize_all(DOCS, 'words', cache=cache)
+    assert (cache.hits, cache.misses) == (3, 6)
+    assert len(cache) == 6
+
+    # Misses tokenized by a process pool are stored as well
+    cache.clear()
+    assert tokenize_all(DOCS, 'code', jobs=2, cache=cache) == expected
+    assert len(cache) == 3
+
+
+def test_cache_skips_anonymous_tokenizers(tmpdir):
+    cache = TokenCache(str(tmpdir))
+    upper = lambda text: text.upper().split()
+    lower = lambda text: text.lower().split()
+    assert tokenize_all(DOCS, upper, cache=cache) == [upper(d) for d in DOCS]
+    assert tokenize_all(DOCS, lower, cache=cache) == [lower(d) for d in DOCS]
+    assert (cache.hits, len(cache)) == (0, 0)
+    with pytest.raises(ValueError):
+        cache.key('some text', 'module.<lambda>')
+
+
+def test_cache_eviction(tmpdir):
+    cache = TokenCache(str(tmpdir), max_size=None)
+    keys = [cache.key(str(i), 'x') for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, ['token'] * 100)
+        os.utime(cache._file(key), (i, i))
+    cache.get(keys[0])
+    entry_size = cache.size // 4
+    cache.evict(2 * entry_size)
+    assert len(cache) == 2
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[3]) is not None
+
+
+def test_cache_eviction_low_water(tmpdir):
+    cache = TokenCache(str(tmpdir), max_size=None)
+    cache.put(cache.key('size', 'x'), ['token'] * 100)
+    entry_size = cache.size
+    cache.clear()
+
+    cache.max_size = 8 * entry_size
+    for i in range(9):
+        cache.put(cache.key(str(i), 'x'), ['token'] * 100)
+    assert cache.size <= LOW_WATER * cache.max_size
+    assert len(cache) == int(LOW_WATER * 8)
+
+
+def test_find_suspects_with_cache(tmpdir):
+    docs = {'a': 'x = 1 + 2', 'b': 'x = 1 + 3', 'c': 'def f(): pass'}
+    path = str(tmpdir)
+    first = find_suspects(docs, cache=path)
+    cache = TokenCache(path)
+    second = find_suspects(docs, cache=cache)
+    assert cache.hits > 0
+    assert list(first.similar_pairs) == list(second.similar_pairs)
@@ -0,0 +1,100 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from plagiarism.bag_of_words import most_similar
+from plagiarism.clusterization import kmeans, minibatch_kmeans, Ring, \
+    similarity_rings, _memmap_file
+
+
+def test_kmeans_sparse_similarity():
+    data = np.array([[1.0, 0.9, 0.1, 0.0],
+                     [0.9, 1.0, 0.0, 0.1],
+                     [0.1, 0.0, 1.0, 0.8],
+                     [0.0, 0.1, 0.8, 1.0]])
+    centroids, labels = kmeans(csr_matrix(data), 2, seed=3)
+    assert centroids.shape == (2, 4)
+    assert labels[0] == labels[1]
+    assert labels[2] == labels[3]
+    assert labels[0] != labels[2]
+
+
+def blobs(n=200, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(3, 10) * 5
+    data = np.vstack([c + rng.randn(n, 10) for c in centers])
+    return data, np.repeat(np.arange(3), n)
+
+
+def same_partition(labels, truth):
+    return len(set(zip(labels, truth))) == len(set(truth))
+
+
+def test_minibatch_kmeans():
+    data, truth = blobs()
+    centroids, labels = minibatch_kmeans(data, 3, batch_size=64, seed=1)
+    assert centroids.shape == (3, 10)
+    assert same_partition(labels, truth)
+
+    _, labels = minibatch_kmeans(csr_matrix(data), 3, seed=1, init='random',
+                                 n_init=5)
+    assert same_partition(labels, truth)
+
+
+def test_kmeans_minibatch_memmap(tmpdir):
+    data, truth = blobs()
+    path = str(tmpdir.join('data.dat'))
+    mmap = np.memmap(path, dtype=float, mode='w+', shape=data.shape)
+    mmap[:] = data
+    mmap.flush()
+    mmap = np.memmap(path, dtype=float, mode='r', shape=data.shape)
+    centroids, labels = kmeans(mmap, 3, seed=2, minibatch=True)
+    assert same_partition(labels, truth)
+    assert abs(centroids).max() > 1
+
+    # Workers reopen the file instead of receiving a copy of the data
+    assert _memmap_file(mmap).filename == path
+    assert _memmap_file(mmap[1:]) is None
+    _, labels = minibatch_kmeans(mmap, 3, seed=2, n_init=2, jobs=2)
+    assert same_partition(labels, truth)
+    _, labels = kmeans(mmap, 3, seed=2)
+    assert same_partition(labels, truth)
+
+    texts = ['a b c', 'a b d', 'x y z', 'x y w']
+    _, labels = kmeans(texts, 2, seed=0, minibatch=True)
+    assert labels[0] == labels[1] != labels[2] == labels[3]
+
+
+def test_similarity_rings():
+    pairs = [(0, 1, 0.9), (1, 2, 0.8), (3, 4, 0.95), (2, 5, 0.1), (6, 6, 1)]
+    rings = similarity_rings(iter(pairs), threshold=0.5)
+    assert [r.members for r in rings] == [[0, 1, 2], [3, 4]]
+    assert rings[0].pairs == 2
+    assert rings[0].min_similarity == 0.8
+    assert rings[0].max_similarity == 0.9
+    assert rings[0].density == 2 / 3
+    assert rings[1].mean_similarity == 0.95
+
+    rings = similarity_rings(pairs, threshold=0.5, size=8, min_size=1)
+    assert len(rings) == 5
+    assert rings[-1] == Ring([7], 1, 0, None, None, None, 0.0)
+
+
+def test_similarity_rings_repeated_pairs():
+    pairs = [(0, 1, 0.9), (1, 0, 0.7), (0, 1, 0.9), (1, 2, 0.8)]
+    ring, = similarity_rings(pairs, threshold=0.5)
+    assert ring.pairs == 2
+    assert ring.density == 2 / 3
+    assert ring.min_similarity == 0.8
+    assert ring.mean_similarity == (0.9 + 0.8) / 2
+
+
+def test_similarity_rings_from_most_similar():
+    data = np.array([[1.0, 0.9, 0.1, 0.0],
+                     [0.9, 1.0, 0.0, 0.2],
+                     [0.1, 0.0, 1.0, 0.8],
+                     [0.0, 0.2, 0.8, 1.0]])
+    similar = most_similar(list('abcd'), data)
+    rings = similarity_rings(similar, threshold=0.5)
+    assert [r.members for r in rings] == [[0, 1], [2, 3]]
+    assert similarity_rings(list(similar), threshold=0.5) == rings
+    assert len(similarity_rings(similar, threshold=0.2)) == 1
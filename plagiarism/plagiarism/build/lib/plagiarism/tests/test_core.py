@@ -0,0 +1,77 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from scipy import sparse as sp_sparse
+from scipy.spatial.distance import pdist
+
+from plagiarism.core import Document, Job, TextDocument, ascii_moving_average
+
+
+def test_text_document_metrics():
+    text = 'Hello World!\n\t42 caf\xe9 \U0001F600'
+    doc = TextDocument(text)
+    letters = sum(c.isascii() and c.isalpha() for c in text)
+    assert doc.whitespace_ratio() == 5 / len(text)
+    assert doc.digits_ratio() == 2 / len(text)
+    assert doc.letters_ratio() == letters / len(text)
+    assert doc.upper_ratio() == 2 / letters
+    assert doc.lower_ratio() == (letters - 2) / letters
+    assert doc.group_count('lo') == 5
+
+
+def test_moving_averages():
+    text = 'abc\ndef €'
+    N = len(text)
+    weight = N * (N - 1) / 2
+    forward = sum(i * ord(c) for i, c in enumerate(text)) / weight
+    reverse = sum(i * ord(c) for i, c in enumerate(text[::-1])) / weight
+
+    doc = TextDocument(text)
+    assert doc.ascii_moving_average() == pytest.approx(forward)
+    assert doc.ascii_moving_average_rev() == pytest.approx(reverse)
+    assert ascii_moving_average(text) == pytest.approx(forward)
+
+
+class WordsDocument(Document):
+    def core_metrics(self):
+        return [len(self.data), self.data.count('a')]
+
+    def optional_metrics(self):
+        return Counter(self.data.split())
+
+
+def make_job():
+    docs = {'a': 'x y z a', 'b': 'x y y q', 'c': 'z z a w', 'd': 'w x x'}
+    return Job(docs, cls=WordsDocument, stop_words='python')
+
+
+def test_job_select_metrics():
+    job = make_job()
+    assert job.select_metrics() == ['a', 'w', 'x', 'y', 'z']
+    assert job.select_metrics(1) == ['x']
+    assert len(job.select_metrics(3)) == 3
+
+
+def test_job_sparse_ndarray():
+    job = make_job()
+    raw = job.ndarray(whiten=False)
+    assert raw.shape == (4, 7)
+    assert raw[1].tolist() == [7, 0, 0, 0, 1, 2, 0]
+
+    optional = job.optional_matrix()
+    assert sp_sparse.issparse(optional)
+    assert (optional.toarray() == raw[:, 2:]).all()
+
+    dense = job.ndarray()
+    sparse = job.ndarray(sparse=True)
+    assert sp_sparse.issparse(sparse)
+    assert np.allclose(dense.std(axis=0), [1] * 7)
+    assert np.allclose(pdist(sparse.toarray()), pdist(dense))
+
+
+def test_job_minibatch_kmeans():
+    job = make_job()
+    centroids, labels = job.kmeans(2, minibatch=True, seed=0)
+    assert centroids.shape == (2, 7)
+    assert len(labels) == 4
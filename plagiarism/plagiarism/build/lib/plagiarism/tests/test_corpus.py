@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from plagiarism.bag_of_words import bag_of_words
+from plagiarism.corpus import CorpusStatistics
+from plagiarism.utils import count_all
+from plagiarism.vocabulary import Vocabulary
+
+DOCS = [
+    'the cat sat on the mat'.split(),
+    'the cat ate the rat'.split(),
+    [],
+    'a dog sat on a log'.split(),
+]
+
+
+@pytest.mark.parametrize('method', ['total', 'doc', 'doc-freq',
+                                    'log-doc-freq'])
+def test_counter_matches_count_all(method):
+    stats = CorpusStatistics(DOCS)
+    expected = count_all(DOCS, method)
+    result = stats.counter(method)
+    assert set(result) == set(expected)
+    for tok, value in expected.items():
+        assert result[tok] == pytest.approx(value)
+
+
+def test_token_ids():
+    vocab = Vocabulary.from_documents(DOCS)
+    stats = CorpusStatistics(vocab.encode_all(DOCS))
+    assert vocab.decode(stats.tokens) == vocab.tokens
+    assert stats.counts.shape == (4, len(vocab))
+    assert stats.doc[vocab.id('the')] == 2
+
+
+def test_bag_of_documents():
+    stats = CorpusStatistics(DOCS)
+    for method in ['boolean', 'frequency', 'count']:
+        expected = [bag_of_words(doc, method) for doc in DOCS]
+        assert stats.bag_of_documents(method) == expected
+
+    weights = count_all(DOCS, 'log-doc-freq')
+    for bag, doc in zip(stats.bag_of_documents(), DOCS):
+        freqs = bag_of_words(doc, 'frequency')
+        assert set(bag) == set(freqs)
+        for tok, f in freqs.items():
+            assert bag[tok] == pytest.approx(f * weights[tok])
+    assert np.isclose(stats.idf, -np.log(stats.doc_freq)).all()
@@ -0,0 +1,45 @@
+from collections import Counter
+from math import log
+
+import numpy as np
+
+from plagiarism.bag_of_words import bag_of_documents, vectorize, \
+    similarity_matrix
+from plagiarism.incremental import IncrementalSuspects
+from plagiarism.tokenizers import tokenize_all
+
+TEXTS = {
+    'a': 'the cat sat on the mat',
+    'b': 'the cat sat on a hat',
+    'c': 'dogs bark loudly at the cat',
+    'd': 'a hat on a mat',
+    'e': '',
+    'f': 'dogs and cats sat on the mat',
+}
+
+
+def full_similarity(suspects):
+    tokenized = tokenize_all(list(suspects.documents.values()))
+    doc_freq = Counter(tok for doc in tokenized for tok in set(doc))
+    idf = {tok: log(len(tokenized) / n) for tok, n in doc_freq.items()}
+    bag = [Counter({tok: x * idf[tok] for tok, x in doc.items()})
+           for doc in bag_of_documents(tokenized, method='frequency')]
+    data = vectorize(bag, tokens=sorted(suspects.vocabulary), sparse=True)
+    return similarity_matrix(data, method='triangular', norm='l1')
+
+
+def test_incremental_matches_full_recomputation():
+    suspects = IncrementalSuspects()
+    for name, text in TEXTS.items():
+        suspects.add(name, text)
+        assert np.allclose(suspects.similarity_matrix(),
+                           full_similarity(suspects))
+
+    for name in ['b', 'e', 'a']:
+        suspects.remove(name)
+        assert np.allclose(suspects.similarity_matrix(),
+                           full_similarity(suspects))
+    assert suspects.names == ['c', 'd', 'f']
+
+    suspects.add('b', TEXTS['b'])
+    assert np.allclose(suspects.similarity_matrix(), full_similarity(suspects))
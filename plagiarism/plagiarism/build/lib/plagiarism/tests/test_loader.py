@@ -0,0 +1,67 @@
+import pickle
+
+import pytest
+
+from plagiarism.loader import LazyDocument, walk_documents, read_text
+from plagiarism.tasks import documents_map, find_suspects
+
+
+def make_tree(tmpdir):
+    tmpdir.join('a.py').write('x = 1\n')
+    tmpdir.join('b.txt').write_binary('caf\xe9\n'.encode('latin-1'))
+    tmpdir.mkdir('sub').join('c.py').write('  y = 2  ')
+    tmpdir.mkdir('.git').join('d.py').write('z = 3')
+    tmpdir.mkdir('__pycache__').join('a.py').write('z = 3')
+    tmpdir.join('e.bin').write_binary(b'\0\1\2')
+    tmpdir.join('big.py').write('w = 4\n' * 100)
+    return str(tmpdir)
+
+
+def test_walk_documents(tmpdir):
+    path = make_tree(tmpdir)
+    names = [name for name, _ in walk_documents(path)]
+    assert names == ['a.py', 'b.txt', 'big.py', 'sub/c.py']
+    names = [name for name, _ in walk_documents(path, include='*.py',
+                                                max_size=100)]
+    assert names == ['a.py', 'sub/c.py']
+    names = [name for name, _ in walk_documents(path, include='*.py',
+                                                exclude=['__pycache__'])]
+    assert names == ['a.py', 'big.py', '.git/d.py', 'sub/c.py']
+    names = [name for name, _ in walk_documents(path, binary=True)]
+    assert 'e.bin' in names
+    names = [name for name, _ in walk_documents(path, recursive=False)]
+    assert names == ['a.py', 'b.txt', 'big.py']
+
+
+def test_walk_documents_invalid_path(tmpdir):
+    path = make_tree(tmpdir)
+    with pytest.raises(FileNotFoundError):
+        walk_documents(str(tmpdir.join('missing')))
+    with pytest.raises(NotADirectoryError):
+        walk_documents(str(tmpdir.join('a.py')))
+    with pytest.raises(FileNotFoundError):
+        find_suspects(str(tmpdir.join('missing')))
+
+
+def test_lazy_document(tmpdir):
+    path = make_tree(tmpdir)
+    assert read_text(str(tmpdir.join('b.txt'))) == 'caf\xe9'
+
+    doc = LazyDocument(str(tmpdir.join('sub', 'c.py')), 'sub/c.py')
+    assert doc.read() == 'y = 2'
+    assert doc._text is None
+    assert str(doc) == 'y = 2'
+    assert doc._text is not None
+    doc.release()
+    assert pickle.loads(pickle.dumps(doc)).read() == 'y = 2'
+
+    docs = documents_map(path, include='*.py')
+    assert docs == {'a.py': 'x = 1', 'big.py': ('w = 4\n' * 100).strip(),
+                    'sub/c.py': 'y = 2'}
+
+
+def test_find_suspects_from_directory(tmpdir):
+    path = make_tree(tmpdir)
+    result = find_suspects(path)
+    assert all(isinstance(doc, LazyDocument)
+               for doc in result.documents.values())
@@ -1,2 +1,39 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from plagiarism.math_utils import similarity, similarity_block
+
+
 def test_cos():
-    pass
\ No newline at end of file
+    pass
+
+
+@pytest.mark.parametrize('method, norm', [
+    ('triangular', 'l1'), ('triangular', 'l2'), ('angle', None),
+])
+def test_similarity_block(method, norm):
+    rng = np.random.RandomState(42)
+    data = rng.rand(6, 5) * (rng.rand(6, 5) > 0.5)
+    data[0] = 0.0
+    data[1] = -data[2]
+    expected = np.array([[similarity(u, v, method, norm=norm) for v in data]
+                         for u in data])
+
+    for matrix in [data, csr_matrix(data)]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = similarity_block(matrix, matrix, method, norm=norm)
+        assert np.allclose(result, expected, equal_nan=True)
+
+
+def test_similarity_block_l2_duplicates():
+    rng = np.random.RandomState(0)
+    data = rng.rand(4, 50) * 1000
+    data[1] = data[0]
+    data[3] = data[2] * (1 + 1e-9)
+    expected = [similarity(data[2], data[3], norm='l2')]
+    for matrix in [data, csr_matrix(data)]:
+        result = similarity_block(matrix, matrix, norm='l2')
+        assert result[0, 1] == result[1, 0] == 1.0
+        assert np.diag(result).tolist() == [1.0] * 4
+        assert np.allclose(result[2, 3], expected, rtol=0, atol=1e-15)
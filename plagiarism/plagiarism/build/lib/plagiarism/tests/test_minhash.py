@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from plagiarism.bag_of_words import bag_of_documents, vectorize, \
+    similarity_matrix, pairs_similarity_matrix
+from plagiarism.minhash import minhash_signatures, lsh_candidates, \
+    lsh_recall, jaccard_estimate
+from plagiarism.tasks import find_suspects
+
+
+def test_minhash_jaccard_estimate():
+    doc1 = ['w%s' % i for i in range(100)]
+    doc2 = ['w%s' % i for i in range(50, 150)]
+    sig = minhash_signatures([doc1, doc1[::-1], doc2], num_perm=256)
+    assert jaccard_estimate(sig, 0, 1) == 1.0
+    assert abs(jaccard_estimate(sig, 0, 2) - 1 / 3) < 0.1
+
+
+def test_lsh_candidates():
+    base = ['w%s' % i for i in range(100)]
+    docs = [base, base[:95], ['x%s' % i for i in range(100)], base[5:]]
+    sig = minhash_signatures(docs, num_perm=64)
+    pairs = lsh_candidates(sig, bands=16, rows=4)
+    assert [0, 1] in pairs.tolist()
+    assert all(2 not in pair for pair in pairs.tolist())
+
+    data = vectorize(bag_of_documents(docs, method='count'), sparse=True)
+    exact = similarity_matrix(data)
+    assert lsh_recall(pairs, exact, 0.9) == 1.0
+
+    approx = pairs_similarity_matrix(data, pairs)
+    for i, j in pairs:
+        assert np.isclose(approx[i, j], exact[i, j])
+        assert np.isclose(approx[j, i], exact[i, j])
+
+
+def test_find_suspects_lsh(tmpdir):
+    docs = {'a': 'x = 1 + 2\ny = x * 3', 'b': 'x = 1 + 2\ny = x * 4',
+            'c': 'def f(): pass'}
+    result = find_suspects(docs, lsh=(8, 2))
+    assert result.similar_pairs[0].indexes == (0, 1)
+    with pytest.raises(ValueError):
+        find_suspects(docs, lsh=(8, 2),
+                      matrix_file=str(tmpdir.join('matrix.dat')))
@@ -1,5 +1,7 @@
-from plagiarism.bag_of_words import count_all
+import pytest
+
 from plagiarism.ngrams import optimal_bigrams, ngrams, remove_ngram
+from plagiarism.utils import count_all
 
 
 def test_ngram_simple():
@@ -40,3 +42,77 @@ def test_fibo_reduced_bigrams(fibo_doc_tokens):
 def test_remove_ngram():
     assert remove_ngram(['foo', 'bar', 'ham', 'spam'], ('bar', 'ham'))\
            == ['foo', 'spam']
+
+
+def test_optimal_bigrams_rounds():
+    docs = [list('abcabcabd'), list('xabcab'), list('cab')]
+    assert optimal_bigrams(docs, min_freq=2) == [
+        ['a', 'b c', 'a', 'b c', 'a b', 'd'],
+        ['x', 'a', 'b c', 'a b'],
+        ['c a', 'b'],
+    ]
+    assert optimal_bigrams(docs, min_freq=2, accumulate=True)[2] == \
+        ['c a', 'b', 'c', 'a']
+    assert optimal_bigrams(docs, min_freq=2, allow_superposition=True) == [
+        ['a b', 'c a', 'b c', 'a b', 'd'],
+        ['x', 'a b', 'c a', 'b'],
+        ['c a', 'b'],
+    ]
+    assert optimal_bigrams(docs, min_freq=2, predictable=False)[0] == \
+        ['a b', 'c', 'a b', 'c', 'a b', 'd']
+
+
+def test_ngrams_accumulate():
+    assert ngrams(['a', 'b', 'c'], 2, accumulate=True) == \
+        ['a', 'b', 'c', 'a b', 'b c']
+    assert ngrams(['a', 'b', 'c'], 3, accumulate=True, join=tuple) == \
+        ['a', 'b', 'c', ('a', 'b'), ('b', 'c'), ('a', 'b', 'c')]
+
+
+def test_ngram_hashes():
+    import numpy as np
+    from plagiarism.ngrams import ngram_hashes
+
+    doc = ['to', 'be', 'or', 'not', 'to', 'be']
+    hashes = ngrams(doc, 2, hashed=True)
+    assert hashes.dtype == np.uint64
+    assert len(hashes) == 5
+    assert hashes[0] == hashes[4]
+    assert len(set(hashes.tolist())) == 4
+    assert ngram_hashes(doc, 7).size == 0
+
+    ids = np.array([1, 2, 3, 1, 2])
+    assert len(ngram_hashes(ids, 2, accumulate=True)) == 5 + 4
+    assert list(ngram_hashes(ids, 1)) != list(ngram_hashes(ids[:4], 2))
+
+
+def test_optimal_bigrams_token_ids():
+    import numpy as np
+
+    docs = [list('abcabcabd'), list('xabcab'), list('cab')]
+    vocab = {tok: i for i, tok in enumerate('abcdx')}
+    arrays = [np.array([vocab[tok] for tok in doc]) for doc in docs]
+    expected = optimal_bigrams(docs, min_freq=2, join=tuple)
+    result = optimal_bigrams(arrays, min_freq=2, join=tuple)
+    tokens = list(vocab)
+    decode = (lambda x: tuple(tokens[i] for i in x) if isinstance(x, tuple)
+              else tokens[x])
+    assert [[decode(x) for x in doc] for doc in result] == expected
+
+    with pytest.raises(ValueError):
+        optimal_bigrams(arrays, min_freq=2)
+
+
+def test_optimal_bigrams_large_ids():
+    import numpy as np
+    from plagiarism.ngrams import ngrams_all
+
+    docs = [list('abcabcabd'), list('xabcab'), list('cab')]
+    hashed = ngrams_all(docs, 2, hashed=True)
+    expected = optimal_bigrams([doc.tolist() for doc in hashed], min_freq=2,
+                               join=tuple)
+    assert optimal_bigrams(hashed, min_freq=2, join=tuple) == expected
+
+    big = [np.array([1, 1 << 40, 1, 1 << 40]), np.array([3, 1])]
+    assert optimal_bigrams(big, min_freq=2, join=tuple) == \
+        [[(1, 1 << 40), (1, 1 << 40)], [3, 1]]
@@ -0,0 +1,84 @@
+import importlib.util
+import os
+
+import pytest
+
+BASEPATH = os.path.dirname(__file__)
+SCRIPT = os.path.join(BASEPATH, *[os.pardir] * 5, 'plagiarism.py')
+
+
+@pytest.fixture(scope='module')
+def script():
+    if not os.path.exists(SCRIPT):
+        pytest.skip('plagiarism.py script not available')
+    spec = importlib.util.spec_from_file_location('plagiarism_script', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def files(tmpdir):
+    tmpdir.join('a.txt').write('def fibo(n):\n    return n\n')
+    tmpdir.join('b.txt').write('def fib(n):\n    return n\n')
+    sub = tmpdir.mkdir('sub')
+    sub.join('c.txt').write('print("hello world")\n' * 3)
+    sub.join('skip.log').write('def fibo(n):\n    return n\n')
+    return str(tmpdir)
+
+
+def test_find_files(script, files):
+    names = [os.path.relpath(path, files)
+             for path in script.find_files([files], '*.txt')]
+    assert names == ['a.txt', 'b.txt', os.path.join('sub', 'c.txt')]
+    assert len(script.find_files([files])) == 4
+
+
+def test_candidate_pairs(script):
+    texts = ['abcd', 'abce', 'xyzw', 'abcdabcdabcd', '', '']
+    pairs = list(script.candidate_pairs(texts, 0.6))
+    assert (0, 1) in pairs
+    assert (0, 2) not in pairs  # no common characters
+    assert (0, 3) not in pairs  # sizes are too different
+    assert (4, 5) in pairs
+
+    # Bounds never discard a pair that reaches the threshold
+    ratios = {(i, j): script.SequenceMatcher(None, texts[i], texts[j]).ratio()
+              for i in range(len(texts)) for j in range(i + 1, len(texts))}
+    assert {pair for pair, r in ratios.items() if r >= 0.6} <= set(pairs)
+
+
+def test_compare_all(script, files):
+    paths = script.find_files([files], '*.txt')
+    results = script.compare_all(paths, threshold=0.5, jobs=1)
+    assert [(os.path.basename(a), os.path.basename(b))
+            for a, b, _ in results] == [('a.txt', 'b.txt')]
+    assert results[0][2] >= 0.9
+    assert script.compare_all(paths, threshold=0.0, jobs=1)[-1][2] < 0.5
+
+
+def test_compare_all_threshold_is_exclusive(script, tmpdir):
+    # Like the two file mode, a ratio equal to the threshold is not reported
+    tmpdir.join('x.txt').write('ab')
+    tmpdir.join('y.txt').write('ac')
+    paths = script.find_files([str(tmpdir)])
+    assert script.compare_all(paths, threshold=0.5, jobs=1) == []
+    assert len(script.compare_all(paths, threshold=0.49, jobs=1)) == 1
+
+
+@pytest.mark.parametrize('fmt, sep', [('tsv', '\t'), ('csv', ',')])
+def test_main_batch_output(script, files, capsys, fmt, sep):
+    script.main(['--batch', files, '--pattern', '*.txt', '--jobs', '1',
+                 '--threshold', '0.5', '--format', fmt])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == sep.join(['file1', 'file2', 'ratio'])
+    assert len(lines) == 2
+    first, second, ratio = lines[1].split(sep)
+    assert os.path.basename(first) == 'a.txt'
+    assert os.path.basename(second) == 'b.txt'
+    assert ratio == '%.6f' % float(ratio)
+
+
+def test_main_requires_two_files(script, files):
+    with pytest.raises(SystemExit):
+        script.main([files])
@@ -0,0 +1,61 @@
+import pytest
+
+from plagiarism.text_distances import all_pairs, gestalt, jaccard, \
+    kolmogorov, ncd_matrix, segmentation
+
+
+@pytest.mark.parametrize('mode', [1, 2, 3])
+def test_hashed_jaccard(mode):
+    a = 'the cat sat on the mat and the cat ran'
+    b = 'a cat sat on the mat and a dog ran'
+    assert len(segmentation(a, mode, hashed=True)) == \
+        len(segmentation(a, mode))
+    assert jaccard(a, b, mode, hashed=True) == jaccard(a, b, mode)
+
+
+DOCS = [
+    'the cat sat on the mat',
+    'the cat sat on a mat',
+    'a dog barked at the mailman',
+    'the dog sat on the mat',
+    'completely unrelated text here',
+]
+
+
+@pytest.mark.parametrize('jobs', [None, 2])
+def test_all_pairs(jobs):
+    result = all_pairs(DOCS, 'gestalt', jobs=jobs, block=2)
+    assert result.shape == (10,)
+    assert result[0] == gestalt(DOCS[0], DOCS[1])
+    assert result[-1] == gestalt(DOCS[3], DOCS[4])
+
+    pairs, dist = all_pairs(DOCS, 'jaccard', jobs=jobs, block=2,
+                            max_distance=0.5, mode=2)
+    expected = [(i, j) for i in range(5) for j in range(i + 1, 5)
+                if jaccard(DOCS[i], DOCS[j], 2) <= 0.5]
+    assert [tuple(p) for p in pairs.tolist()] == expected
+    assert len(dist) == len(expected)
+
+
+@pytest.mark.parametrize('compressor', ['zlib', 'bz2', 'lzma'])
+def test_ncd_matrix(compressor):
+    matrix = ncd_matrix(DOCS, compressor)
+    assert matrix.shape == (5, 5)
+    assert (matrix == matrix.T).all()
+    for i, j in [(0, 1), (1, 4), (2, 3)]:
+        assert matrix[i, j] == pytest.approx(
+            kolmogorov(DOCS[i], DOCS[j], compressor))
+
+
+def test_bounded_gestalt():
+    a, b = 'x = 1\n' * 50, 'def f(): pass'
+    exact = gestalt(a, b)
+    bounded = gestalt(a, b, threshold=0.9)
+    assert 1 - 0.9 < bounded <= exact
+    assert gestalt(DOCS[0], DOCS[1], threshold=0.5) == gestalt(DOCS[0],
+                                                               DOCS[1])
+
+    # Token mode compares whole tokens
+    assert gestalt('foo = bar', 'foo=bar', tokens=True) == 0
+    assert gestalt('foo = bar', 'foo=bar') > 0
+    assert gestalt('abcdef', 'abcxyz', max_size=3) == 0
@@ -1,4 +1,6 @@
-from plagiarism.tokenizers import split_python_tokens, split_programming_tokens
+from plagiarism import tokenizers
+from plagiarism.tokenizers import split_python_tokens, \
+    split_programming_tokens, stemmize, tokenize_all
 
 
 def test_python_tokens(fibo):
@@ -18,3 +20,71 @@ def test_generic_programming_tokens(fibo):
         'x', ',', 'y', '=', 'y', ',', 'x', '+', 'y',
         'return', 'x'
     ]
+
+
+def test_tokenize_all_parallel(monkeypatch):
+    monkeypatch.setattr(tokenizers, 'PARALLEL_MIN_SIZE', 0)
+    docs = ['x = %s + y' % ('1' * i) for i in range(20)]
+    expected = [split_programming_tokens(doc) for doc in docs]
+    assert tokenize_all(docs, 'code', jobs=2) == expected
+    assert tokenize_all(docs, 'english', jobs=2) == \
+        [stemmize(doc, language='english') for doc in docs]
+
+
+def test_balanced_chunks():
+    docs = ['a' * n for n in [10, 1, 1, 1, 8, 2]]
+    chunks = tokenizers._balanced_chunks(docs, 2)
+    assert sorted(sum(chunks, [])) == list(range(6))
+    assert sorted(sum(len(docs[i]) for i in chunk) for chunk in chunks) \
+        == [11, 12]
+
+
+def test_programming_tokens_single_pass():
+    code = 'int main() {\n  x[0] = f(*args) // 1.5e3;\n' \
+           '  s = "a \\" b";  /* c */\n}\n@property'
+    assert split_programming_tokens(code) == [
+        'int', 'main', '(', ')', '{',
+        'x', '[', '0', ']', '=', 'f', '(', '*', 'args', ')', '//', '1.5e3',
+        ';', 's', '=', '"a \\" b"', ';', '/*', 'c', '*/',
+        '}', '@property',
+    ]
+
+
+def test_programming_tokens_compound_operators():
+    # Operators and signed numbers match the scanner before the single-pass
+    # lexer, which also kept them whole
+    code = 'if a != b:\n  x += 1\n  y -= 2\ndef f() -> int:\n  x = -1'
+    assert split_programming_tokens(code) == [
+        'if', 'a', '!=', 'b', ':',
+        'x', '+=', '1',
+        'y', '-=', '2',
+        'def', 'f', '(', ')', '->', 'int', ':',
+        'x', '=', '-1',
+    ]
+    assert split_programming_tokens('f(-1) + x-1') == \
+        ['f', '(', '-1', ')', '+', 'x', '-', '1']
+
+
+def test_stemmize_memo(monkeypatch):
+    from plagiarism import tokenizers
+    from plagiarism.stopwords import get_stop_words
+    from plagiarism.text import strip_punctuation
+
+    text = 'The runners were running, and the runner runs! Running...'
+    stemmer = tokenizers.get_stemmer('english')
+    stop_stems = set(stemmer.stemWords(get_stop_words('english')))
+    words = [strip_punctuation(w) for w in text.casefold().split()]
+    expected = [w for w in stemmer.stemWords(words)
+                if w and w not in stop_stems]
+
+    assert stemmize(text, language='english') == expected
+    assert stemmize(text, language='english') == expected
+    assert stemmize(text, language='english', stop_words=[]) == \
+        stemmer.stemWords(words)
+    assert tokenizers.get_stop_stems('english') is \
+        tokenizers.get_stop_stems('english')
+
+    monkeypatch.setattr(tokenizers, 'STEM_MEMO_SIZE', 2)
+    monkeypatch.setattr(tokenizers, '_STEM_MEMO', {})
+    assert stemmize(text, language='english') == expected
+    assert len(tokenizers._STEM_MEMO['english']) <= 2
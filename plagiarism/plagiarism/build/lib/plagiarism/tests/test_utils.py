@@ -1,3 +1,5 @@
+from math import log
+
 from plagiarism.utils import count_all, timeit
 
 
@@ -22,3 +24,24 @@ def test_timeit():
         pass
     assert dt.value > intermediate
 
+
+def test_count_all_document_frequency():
+    docs = [['a', 'a', 'b'], ['a', 'c'], ['a']]
+    assert count_all(docs, 'doc') == {'a': 3, 'b': 1, 'c': 1}
+    weights = count_all(docs, 'log-doc-freq')
+    assert abs(weights['a']) < 1e-12
+    assert abs(weights['b'] - log(3)) < 1e-12
+
+
+def test_count_all_hashed_ids():
+    import numpy as np
+    from plagiarism.ngrams import ngrams_all
+
+    docs = [list('abcab'), list('cab')]
+    hashed = ngrams_all(docs, 2, hashed=True)
+    lists = [doc.tolist() for doc in hashed]
+    for method in ['total', 'doc', 'doc-freq', 'log-doc-freq']:
+        assert count_all(hashed, method) == count_all(lists, method)
+
+    ids = [np.array([-5, 1 << 40, -5]), np.array([1 << 40])]
+    assert count_all(ids) == {-5: 2, 1 << 40: 2}
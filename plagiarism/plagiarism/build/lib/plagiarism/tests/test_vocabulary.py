@@ -0,0 +1,54 @@
+import numpy as np
+
+from plagiarism.bag_of_words import bag_of_documents
+from plagiarism.minhash import minhash_signatures
+from plagiarism.ngrams import optimal_bigrams
+from plagiarism.utils import count_all, tokens_all
+from plagiarism.vocabulary import Vocabulary
+
+DOCS = [
+    'the cat sat on the mat'.split(),
+    'the cat ate the rat'.split(),
+    'a dog sat on a log'.split(),
+]
+
+
+def test_encode_decode():
+    vocab = Vocabulary.from_documents(DOCS)
+    assert vocab.tokens == sorted(vocab.tokens)
+    encoded = vocab.encode_all(DOCS, add=False)
+    assert all(doc.dtype == np.int32 for doc in encoded)
+    assert vocab.decode_all(encoded) == DOCS
+    assert vocab.id('new') == len(vocab) - 1
+    assert vocab.join([vocab.id('the'), vocab.id('cat')]) == \
+        vocab.id('the cat')
+
+
+def test_stop_words_mask():
+    vocab = Vocabulary.from_documents(DOCS)
+    mask = vocab.mask(['the', 'a', 'missing'])
+    assert mask.sum() == 2
+    doc = vocab.remove_tokens(vocab.encode(DOCS[0]), mask)
+    assert vocab.decode(doc) == ['cat', 'sat', 'on', 'mat']
+
+
+def test_pipeline_accepts_ids():
+    vocab = Vocabulary.from_documents(DOCS)
+    encoded = vocab.encode_all(DOCS, add=False)
+
+    for method in ['total', 'doc', 'doc-freq', 'log-doc-freq']:
+        expected = count_all(DOCS, method)
+        result = count_all(encoded, method)
+        assert {vocab[i]: n for i, n in result.items()} == expected
+
+    assert vocab.decode(tokens_all(encoded)) == tokens_all(DOCS)
+
+    bag = bag_of_documents(encoded)
+    expected = bag_of_documents(DOCS)
+    assert [{vocab[i]: x for i, x in doc.items()} for doc in bag] == expected
+
+    merged = optimal_bigrams(encoded, min_freq=2, join=vocab.join)
+    assert vocab.decode_all(merged) == optimal_bigrams(DOCS, min_freq=2)
+
+    signatures = minhash_signatures(encoded, 16)
+    assert signatures.shape == (3, 16)
@@ -0,0 +1,33 @@
+from plagiarism.winnowing import kgram_hashes, winnow, fingerprints, \
+    FingerprintIndex
+
+
+def test_rolling_hash_matches_kgrams():
+    tokens = 'a b c a b c d'.split()
+    hashes = kgram_hashes(tokens, 3)
+    assert len(hashes) == 5
+    assert hashes[0] == hashes[3]
+    assert len(set(hashes)) == 4
+
+
+def test_winnow():
+    hashes = [77, 74, 42, 17, 98, 50, 17, 98, 8, 88, 67, 39, 77, 74, 42, 17]
+    assert winnow(hashes, 4) == [(17, 3), (17, 6), (8, 8), (39, 11),
+                                 (17, 15)]
+    assert winnow([3, 1, 2], 4) == [(1, 1)]
+    assert winnow([], 4) == []
+
+
+def test_fingerprint_index():
+    code = 'def fibo(n):\n    x, y = 1, 1\n    for _ in range(n):\n' \
+           '        x, y = y, x + y\n    return x\n'
+    renamed = code.replace('fibo', 'fib')
+    other = 'while True:\n    print("hello world")\n'
+    index = FingerprintIndex(k=4, window=3)
+    index.add_all({'a': code, 'b': renamed, 'c': other})
+    shared = index.shared_counts()
+    assert shared[0, 1] > 0
+    assert shared[0, 1] == shared[1, 0]
+    assert shared[0, 2] == shared[1, 2] == 0
+    assert index.similarity_matrix()[0, 1] > 0.5
+    assert fingerprints(['a', 'b'], k=4) == []
@@ -3,16 +3,38 @@
 '''
 
 import bz2
+import concurrent.futures
 import difflib
+import functools
+import lzma
+import os
+import pickle
+import zlib
 
-__all__ = ['jaccard', 'gestalt', 'kolmogorov', 'combined']
+import numpy as np
 
+from plagiarism.ngrams import ngram_hashes, token_ids
+from plagiarism.tokenizers import split_programming_tokens
+from plagiarism.vocabulary import Vocabulary
 
-def segmentation(source, mode=1):
-    """segmentation of a given string via shingling or splitting"""
+__all__ = ['jaccard', 'gestalt', 'kolmogorov', 'combined', 'all_pairs',
+           'ncd_matrix']
+
+
+def segmentation(source, mode=1, hashed=False):
+    """segmentation of a given string via shingling or splitting
+
+    If hashed is True, return an uint64 array with the hash of each shingle
+    instead of a list of tuples of words."""
 
     segments = source.split()
 
+    if hashed:
+        ids = token_ids(segments)
+        parts = [ngram_hashes(ids, length)[:len(segments) - length]
+                 for length in range(1, mode + 1)]
+        return np.concatenate(parts) if parts else np.zeros(0, np.uint64)
+
     # compute shingling list with maximum word length of "mode"
     result = []
 
@@ -23,10 +45,19 @@ def segmentation(source, mode=1):
     return result
 
 
-def jaccard(source0, source1, mode=1):
+def jaccard(source0, source1, mode=1, hashed=False):
     """popular similarity measure for two given sets"""
 
     # calculate shingling sets
+    if hashed:
+        set0 = np.unique(segmentation(source0, mode=mode, hashed=True))
+        set1 = np.unique(segmentation(source1, mode=mode, hashed=True))
+        inter = len(np.intersect1d(set0, set1, assume_unique=True))
+        union = len(set0) + len(set1) - inter
+        if union == 0:
+            return float("infinity")
+        return float(union - inter) / union
+
     set0 = set(segmentation(source0, mode=mode))
     set1 = set(segmentation(source1, mode=mode))
 
@@ -39,28 +70,265 @@ def jaccard(source0, source1, mode=1):
     return float(len(union) - len(inter)) / len(union)
 
 
-def gestalt(source0, source1):
-    """popular Gestalt-algorithm implemented in difflib"""
+def gestalt(source0, source1, threshold=None, tokens=False, autojunk=True,
+            max_size=None):
+    """popular Gestalt-algorithm implemented in difflib
+
+    Args:
+        threshold (float):
+            minimum similarity of interest. Cheap upper bounds of the ratio
+            (length ratio, then quick_ratio()) are tried first and, if one
+            of them is below threshold, 1 - bound is returned without
+            computing the full ratio. The result is then only a lower bound
+            of the distance.
+        tokens (bool):
+            if True, compare sequences of programming tokens (see
+            plagiarism.tokenizers.split_programming_tokens) instead of
+            characters.
+        autojunk (bool):
+            passed to difflib.SequenceMatcher.
+        max_size (int):
+            if given, only the first max_size characters (or tokens) of each
+            source are compared, which bounds the cost of each call."""
 
-    match = difflib.SequenceMatcher(a=source0, b=source1)
+    if tokens:
+        source0, source1 = _token_ids(source0, source1)
+    if max_size is not None:
+        source0, source1 = source0[:max_size], source1[:max_size]
+
+    if threshold is not None:
+        # Same as SequenceMatcher.real_quick_ratio(), without building the
+        # matcher
+        total = len(source0) + len(source1)
+        bound = 2.0 * min(len(source0), len(source1)) / total if total else 1
+        if bound < threshold:
+            return 1 - bound
+
+    match = difflib.SequenceMatcher(a=source0, b=source1, autojunk=autojunk)
+    if threshold is not None:
+        bound = match.quick_ratio()
+        if bound < threshold:
+            return 1 - bound
 
     return 1 - match.ratio()
 
 
-def kolmogorov(source0, source1):
+def _token_ids(*sources):
+    """convert sources to lists of ids of programming tokens"""
+
+    vocabulary = Vocabulary()
+    return [vocabulary.encode(split_programming_tokens(source)).tolist()
+            for source in sources]
+
+
+def kolmogorov(source0, source1, compressor='bz2', level=None):
     """approximate Kolmogorov distance via compression"""
     source0, source1 = source0.encode('utf-8'), source1.encode('utf-8')
 
-    comp01 = len(bz2.compress(source0))
-    comp10 = len(bz2.compress(source1))
-    comp11 = len(bz2.compress(source0 + source1))
+    comp01 = compressed_size(source0, compressor, level)
+    comp10 = compressed_size(source1, compressor, level)
+    comp11 = compressed_size(source0 + source1, compressor, level)
 
     return float(comp11 - min(comp01, comp10)) / max(comp01, comp10)
 
 
+def compressed_size(data, compressor='bz2', level=None):
+    """size of data (bytes) compressed with bz2, zlib or lzma"""
+
+    if compressor == 'bz2':
+        return len(bz2.compress(data, 9 if level is None else level))
+    elif compressor == 'zlib':
+        return len(zlib.compress(data, -1 if level is None else level))
+    elif compressor == 'lzma':
+        return len(lzma.compress(data, preset=level))
+    raise ValueError('invalid compressor: %r' % compressor)
+
+
+def ncd_matrix(documents, compressor='zlib', level=None, jobs=None):
+    """normalized compression distance between all pairs of documents
+
+    Equivalent to calling kolmogorov(documents[i], documents[j],
+    compressor, level) for i < j, but each document is compressed alone only
+    once. Note that the default compressor is zlib, while kolmogorov()
+    defaults to bz2, so pass compressor='bz2' to reproduce its default
+    distances. With zlib, the compressor state after document i is
+    snapshotted with copy() and reused for all concatenations
+    documents[i] + documents[j], so these only pay for compressing
+    documents[j].
+
+    Args:
+        documents:
+            list of strings.
+        compressor:
+            'zlib' (default, fastest), 'bz2' or 'lzma'.
+        level:
+            compression level (preset for lzma). None uses the default of
+            each compressor (9 for bz2, as in kolmogorov()).
+        jobs (int):
+            number of worker processes used to compute rows of the matrix.
+
+    Returns:
+        a symmetric (N x N) array with zeros in the diagonal.
+    """
+
+    documents = [str(doc).encode('utf-8') for doc in documents]
+    size = len(documents)
+    if compressor not in ('zlib', 'bz2', 'lzma'):
+        raise ValueError('invalid compressor: %r' % compressor)
+    if jobs is not None and jobs < 0:
+        jobs = os.cpu_count() or 1
+
+    args = [(i, compressor, level) for i in range(size - 1)]
+    _init_worker(documents)
+    try:
+        sizes = np.array([compressed_size(doc, compressor, level)
+                          for doc in documents], dtype=float)
+        if not jobs or jobs == 1 or size < 3:
+            rows = list(map(_ncd_row, args))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                    jobs, initializer=_init_worker,
+                    initargs=(documents,)) as pool:
+                rows = list(pool.map(_ncd_row, args, chunksize=4))
+    finally:
+        _init_worker(None)
+
+    result = np.zeros((size, size))
+    for i, row in enumerate(rows):
+        small = np.minimum(sizes[i], sizes[i + 1:])
+        large = np.maximum(sizes[i], sizes[i + 1:])
+        result[i, i + 1:] = result[i + 1:, i] = (row - small) / large
+    return result
+
+
+def _ncd_row(args):
+    """compressed sizes of documents[i] + documents[j] for all j > i"""
+
+    i, compressor, level = args
+    docs = _DOCUMENTS
+    if compressor != 'zlib':
+        return np.array([compressed_size(docs[i] + doc, compressor, level)
+                         for doc in docs[i + 1:]], dtype=float)
+
+    state = zlib.compressobj(-1 if level is None else level)
+    prefix = len(state.compress(docs[i]))
+    result = []
+    for doc in docs[i + 1:]:
+        copy = state.copy()
+        result.append(prefix + len(copy.compress(doc)) + len(copy.flush()))
+    return np.array(result, dtype=float)
+
+
 def combined(source0, source1, jaccard_mode=1):
     """combine all approaches to find different types of plagiarism"""
 
     return min(jaccard(source0, source1, jaccard_mode),
                gestalt(source0, source1),
-               kolmogorov(source0, source1))
\ No newline at end of file
+               kolmogorov(source0, source1))
+
+
+def all_pairs(documents, metric='combined', jobs=None, block=64,
+              max_distance=None, **kwargs):
+    """compute the distance between all pairs of documents
+
+    The upper triangle of the distance matrix is split in block x block
+    tiles, which are evaluated in a process pool if jobs > 1 (or -1 for one
+    worker per cpu).
+
+    Args:
+        documents:
+            list of strings.
+        metric:
+            name of a distance function in this module or any function
+            receiving two strings. Extra keyword arguments are passed to it.
+            For gestalt, max_distance is also used as its threshold.
+        jobs (int):
+            number of worker processes. Metrics that cannot be pickled are
+            evaluated serially.
+        block (int):
+            tile size.
+        max_distance (float):
+            if given, only pairs with distance <= max_distance are kept.
+
+    Returns:
+        a condensed distance array in the same order as
+        scipy.spatial.distance.pdist(), or, if max_distance is given, a tuple
+        (pairs, distances) with a (m x 2) array of indexes i < j and the
+        array with their respective distances.
+    """
+
+    if isinstance(metric, str):
+        if metric not in _METRICS:
+            raise ValueError('invalid metric: %r' % metric)
+        metric = globals()[metric]
+    if metric is gestalt and max_distance is not None:
+        kwargs.setdefault('threshold', 1 - max_distance)
+    if kwargs:
+        metric = functools.partial(metric, **kwargs)
+    documents = [str(doc) for doc in documents]
+    size = len(documents)
+    tiles = [(start, stop, start2, stop2)
+             for start, stop in _ranges(size, block)
+             for start2, stop2 in _ranges(size, block) if start2 >= start]
+    args = [(metric, tile, max_distance) for tile in tiles]
+
+    if jobs is not None and jobs < 0:
+        jobs = os.cpu_count() or 1
+    try:
+        pickle.dumps(metric)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        jobs = None
+    if not jobs or jobs == 1 or len(tiles) < 2:
+        _init_worker(documents)
+        try:
+            results = list(map(_pairs_tile, args))
+        finally:
+            _init_worker(None)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                jobs, initializer=_init_worker,
+                initargs=(documents,)) as pool:
+            results = list(pool.map(_pairs_tile, args))
+
+    rows, cols, values = (
+        np.concatenate([r[k] for r in results] or [np.zeros(0, dtype=int)])
+        for k in range(3))
+    if max_distance is not None:
+        order = np.lexsort((cols, rows))
+        pairs = np.stack([rows[order], cols[order]], axis=1)
+        return pairs.reshape(-1, 2), values[order].astype(float)
+
+    result = np.zeros(size * (size - 1) // 2)
+    result[size * rows - rows * (rows + 1) // 2 + cols - rows - 1] = values
+    return result
+
+
+_METRICS = ['jaccard', 'gestalt', 'kolmogorov', 'combined']
+_DOCUMENTS = None
+
+
+def _ranges(size, block):
+    return [(i, min(i + block, size)) for i in range(0, size, block)]
+
+
+def _init_worker(documents):
+    global _DOCUMENTS
+    _DOCUMENTS = documents
+
+
+def _pairs_tile(args):
+    """evaluate metric in a tile of the upper triangle"""
+
+    metric, (start, stop, start2, stop2), max_distance = args
+    docs = _DOCUMENTS
+    rows, cols, values = [], [], []
+    for i in range(start, stop):
+        doc = docs[i]
+        for j in range(max(start2, i + 1), stop2):
+            value = metric(doc, docs[j])
+            if max_distance is None or value <= max_distance:
+                rows.append(i)
+                cols.append(j)
+                values.append(value)
+    return (np.array(rows, dtype=int), np.array(cols, dtype=int),
+            np.array(values, dtype=float))
@@ -1,21 +1,52 @@
+import concurrent.futures
+import heapq
+import os
+import pickle
 import re
 import string
 import tokenize
 from Stemmer import Stemmer, algorithms as _stemmer_algorithms
-from collections import deque
 from functools import lru_cache
 
 import functools
 
+from plagiarism.cache import get_cache, is_cacheable
+from plagiarism.loader import LazyDocument
 from plagiarism.stopwords import get_stop_words
 from plagiarism.text import strip_punctuation
 
 __all__ = [
     'split_to_words', 'stemmize', 'split_programming_tokens',
-    'split_python_tokens'
+    'split_python_tokens', 'tokenizer_name',
 ]
 
 
+#: Inputs with fewer characters than this are always tokenized serially
+PARALLEL_MIN_SIZE = 1 << 20
+
+#: Alternation of all token types recognized by split_programming_tokens().
+#: The first alternative that matches at a given position wins.
+PROGRAMMING_TOKEN_REGEX = re.compile('|'.join('(?P<%s>%s)' % item for item in [
+    ('whitespace', r'\s+'),
+    ('comment', r'//|/\*|\*/'),
+    # Like comments, the content of multi-line strings is split in tokens
+    ('triple_quotes', r"'''|" + r'"""'),
+    ('string', r"'[^\n'\\]*(?:\\.[^\n'\\]*)*'|" +
+               r'"[^\n"\\]*(?:\\.[^\n"\\]*)*"'),
+    # A sign is part of the number unless it follows an operand (x-1)
+    ('number', r'(?:(?<![\w)\]}])[-+])?(?:%s)(?!\w)' % tokenize.Number),
+    ('name', r'@?\w+'),
+    ('symbol', r'[()[\]{},;#]'),
+    ('compound', r'[*+\-/^&|!]=|->'),
+    ('operator', r'[*+\-./^&|!]+'),
+    ('other', r'[^\s\w()[\]{},;#*+\-./^&|!\'"@]+|.'),
+]))
+
+#: Maximum number of words in the word -> stem memo of each language. The
+#: memo is cleared when it grows past this size.
+STEM_MEMO_SIZE = 100000
+_STEM_MEMO = {}
+
 KEEP_LETTERS_TABLE = {
     i: ' '
     for i in range(1, 256)
@@ -51,6 +82,9 @@ def stemmize(text, language=None, stop_words=None, ngrams=1):
     """
     Receive a string of text and return a list of stems.
 
+    Each distinct word is stemmed only once. Stems are memoized per language
+    across calls and stemmed stop words are cached.
+
     Args:
         text (str):
             A string of text to stemize.
@@ -61,14 +95,14 @@ def stemmize(text, language=None, stop_words=None, ngrams=1):
         ngrams (int):
             If given, uses n-grams instead of tokens.
     """
-    stemmer = get_stemmer(language)
 
-    if stop_words is None:
-        stop_words = get_stop_words(language)
-    stop_stems = set(stemmer.stemWords(stop_words))
+    if stop_words is not None:
+        stop_words = tuple(stop_words)
+    stop_stems = get_stop_stems(language, stop_words)
     words = text.casefold().split()
-    words = stemmer.stemWords([strip_punctuation(word) for word in words])
-    data = [w for w in words if w and w not in stop_stems]
+    stems = _stem_words(set(words), language)
+    data = [stem for stem in map(stems.__getitem__, words)
+            if stem and stem not in stop_stems]
     if ngrams == 1:
         return data
     else:
@@ -79,6 +113,49 @@ def stemmize(text, language=None, stop_words=None, ngrams=1):
         return result
 
 
+@lru_cache(maxsize=50)
+def get_stop_stems(language=None, stop_words=None):
+    """
+    Return a frozenset with the stems of the stop words for the given
+    language.
+
+    If stop_words is given, it must be a tuple and it replaces the default
+    list of stop words for the language.
+    """
+
+    stemmer = get_stemmer(language)
+    if stop_words is None:
+        stop_words = get_stop_words(language)
+    return frozenset(stemmer.stemWords(list(stop_words)))
+
+
+def _stem_words(words, language=None):
+    """
+    Return a dictionary mapping each word in the given set to its stem.
+
+    Only words missing from the memo of the language are sent to the stemmer.
+    """
+
+    memo = _STEM_MEMO.setdefault(language or 'english', {})
+    stems = {}
+    missing = []
+    for word in words:
+        stem = memo.get(word)
+        if stem is None:
+            missing.append(word)
+        else:
+            stems[word] = stem
+
+    if missing:
+        stemmer = get_stemmer(language)
+        new = stemmer.stemWords([strip_punctuation(w) for w in missing])
+        stems.update(zip(missing, new))
+        if len(memo) + len(missing) > STEM_MEMO_SIZE:
+            memo.clear()
+        memo.update(zip(missing[:STEM_MEMO_SIZE], new))
+    return stems
+
+
 def split_python_tokens(text, exclude=('ENCODING',)):
     """
     Uses python lexer to split source into a curated list of real python tokens.
@@ -97,91 +174,159 @@ def split_python_tokens(text, exclude=('ENCODING',)):
 def split_programming_tokens(text):
     """
     Split text in tokens that should work for most programming languages.
-    """
 
-    ws_regex = re.compile(r'[ \f\t]+')
-    regexes = [
-        # Whitespace
-        ws_regex,
-
-        # Single char symbols
-        re.compile(r'[\n()[\]{\},;#]'),
-
-        # Common comments
-        re.compile(r'(//|/\*|\*/|\n\r)'),
-
-        # Operators
-        re.compile(r'[*+-/\^&|!]+'),
-
-        # Strings
-        re.compile(
-            r'''('[^\n'\\]*(?:\\.[^\n'\\]*)*'|"[^\n"\\]*(?:\\.[^\n"\\]*)*")'''),
-        re.compile(r"""('''[^'\\]*(?:\\.['\\]*)*'''|""" +
-                   r'''"""[^"\\]*(?:\\.[^"\\]*)*""")'''),
-
-        # Numbers
-        re.compile(tokenize.Number),
-
-        # Names and decorators
-        re.compile(tokenize.Name),
-        re.compile('@' + tokenize.Name),
-    ]
-    tokens = []
-    lines = deque(text.splitlines())
-    while lines:
-        stream = lines.popleft()
-        while stream:
-            if stream[0].isspace():
-                idx = ws_regex.match(stream).span()[1]
-                stream = stream[idx:]
-                continue
-
-            pos = endpos = len(stream)
-            for regex in regexes:
-                match = regex.search(stream)
-                if match is None:
-                    continue
-                idx, end = match.span()
-                if end == 0:
-                    continue
-                elif idx == 0:
-                    token, stream = stream[:idx], stream[idx:]
-                    tokens.append(token)
-                    break
-                elif idx < pos or idx == pos and end > endpos:
-                    pos, endpos = idx, end
-
-            if pos == 0:
-                tokens.append(stream[:endpos])
-                stream = stream[endpos:]
-            elif pos == endpos:
-                tokens.append(stream)
-                stream = ''
-            else:
-                tokens.append(stream[:pos])
-                tokens.append(stream[pos:endpos])
-                stream = stream[endpos:]
+    Text is scanned in a single left-to-right pass of PROGRAMMING_TOKEN_REGEX.
+    """
 
-    return [tok for tok in tokens if tok and not tok.isspace()]
+    return [match.group()
+            for match in PROGRAMMING_TOKEN_REGEX.finditer(text)
+            if match.lastgroup != 'whitespace']
 
 
-def tokenize_all(documents, tokenizer=None, **kwargs):
+def tokenize_all(documents, tokenizer=None, jobs=None, cache=None,
+                 **kwargs):
     """
     Tokenize a sequence of documents.
 
     Args:
         documents:
-            List of documents
+            List of documents. LazyDocument handles are read right before
+            tokenization and their text is not kept in memory.
         tokenizer:
             Tokenizer function or function name.
+        jobs (int):
+            Number of worker processes. If greater than 1 (or -1 for one
+            worker per cpu), documents are sent to a process pool in chunks of
+            approximately the same total size. Small inputs and tokenizers
+            that cannot be pickled are processed serially.
+        cache:
+            An optional plagiarism.cache.TokenCache instance or cache
+            directory. Documents found in the cache are not tokenized again
+            and the remaining ones are stored after tokenization. Lambdas
+            and nested functions are never cached.
         **kwargs:
             Extra arguments passed to the tokenizer function.
     """
 
+    tokenizer = get_tokenizer(tokenizer)
+    documents = list(documents)
+    cache = get_cache(cache)
+    if cache is not None:
+        return _tokenize_cached(documents, tokenizer, jobs, cache, kwargs)
+    if jobs is not None and jobs < 0:
+        jobs = os.cpu_count() or 1
+    if not jobs or jobs == 1 or len(documents) < 2 or \
+            sum(map(len, documents)) < PARALLEL_MIN_SIZE:
+        return [tokenizer(_read(doc), **kwargs) for doc in documents]
+
+    func = functools.partial(tokenizer, **kwargs) if kwargs else tokenizer
+    try:
+        pickle.dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return [func(_read(doc)) for doc in documents]
+
+    chunks = _balanced_chunks(documents, jobs * 4)
+    result = [None] * len(documents)
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        args = [(func, [documents[i] for i in chunk]) for chunk in chunks]
+        for chunk, tokens in zip(chunks, pool.map(_tokenize_chunk, args)):
+            for i, doc in zip(chunk, tokens):
+                result[i] = doc
+    return result
+
+
+def _tokenize_cached(documents, tokenizer, jobs, cache, kwargs):
+    """
+    Implements tokenize_all() with a cache.
+    """
+
+    tokenizer_id = tokenizer_name(tokenizer, **kwargs)
+    if not is_cacheable(tokenizer_id):
+        return tokenize_all(documents, tokenizer, jobs=jobs, **kwargs)
+    serial = not jobs or jobs == 1
+    result = []
+    missing = []  # (index, key) of documents not in cache
+    for i, doc in enumerate(documents):
+        text = _read(doc)
+        key = cache.key(text, tokenizer_id)
+        tokens = cache.get(key)
+        if tokens is None:
+            if serial:
+                tokens = tokenizer(text, **kwargs)
+                cache.put(key, tokens)
+            else:
+                missing.append((i, key))
+        result.append(tokens)
+
+    # Only handles are kept: workers read lazy documents again, so the texts
+    # of missing documents are never held together in memory.
+    docs = [documents[i] for i, _ in missing]
+    tokenized = tokenize_all(docs, tokenizer, jobs=jobs, **kwargs)
+    for (i, key), tokens in zip(missing, tokenized):
+        cache.put(key, tokens)
+        result[i] = tokens
+    return result
+
+
+def get_tokenizer(tokenizer=None):
+    """
+    Return tokenizer function from a name or function. The default tokenizer
+    is split_to_words.
+    """
+
     if not callable(tokenizer):
         tokenizer = tokenizer or 'words'
         tokenizer = TOKENIZER_DICT[tokenizer.replace('_', '-')]
-    return [tokenizer(doc, **kwargs) for doc in documents]
+    return tokenizer
+
+
+def _tokenize_chunk(args):
+    func, documents = args
+    return [func(_read(doc)) for doc in documents]
+
+
+def _read(document):
+    if isinstance(document, LazyDocument):
+        return document.read()
+    return document
+
+
+def _balanced_chunks(documents, n):
+    """
+    Split the indexes of documents in at most n chunks with approximately the
+    same total size. Each chunk lists its indexes in increasing order.
+    """
+
+    heap = [(0, i, []) for i in range(min(n, len(documents)))]
+    order = sorted(range(len(documents)), key=lambda i: -len(documents[i]))
+    for idx in order:
+        size, i, chunk = heapq.heappop(heap)
+        chunk.append(idx)
+        heapq.heappush(heap, (size + len(documents[idx]), i, chunk))
+    return [sorted(chunk) for _, _, chunk in sorted(heap, key=lambda x: x[1])
+            if chunk]
+
+
+def tokenizer_name(tokenizer, **kwargs):
+    """
+    Return a string that identifies the given tokenizer (and its extra
+    arguments) across different runs.
+
+    Tokenizer names are normalized and functions are identified by their
+    qualified names.
+    """
+
+    tokenizer = get_tokenizer(tokenizer)
+    if isinstance(tokenizer, functools.partial):
+        kwargs = dict(tokenizer.keywords, **kwargs)
+        tokenizer = tokenizer.func
+    name = '%s.%s' % (tokenizer.__module__,
+                      getattr(tokenizer, '__qualname__', tokenizer.__name__))
+    if kwargs:
+        args = ', '.join('%s=%r' % item for item in sorted(kwargs.items()))
+        name = '%s(%s)' % (name, args)
+    return name
+
 
 TOKENIZER_DICT = {
     'words': split_to_words,
@@ -198,5 +343,5 @@ TOKENIZER_DICT = {
 
 # Language support
 for _lang in _stemmer_algorithms():
-    _func = functools.partial(stemmize, language='language')
+    _func = functools.partial(stemmize, language=_lang)
     TOKENIZER_DICT[_lang] = _func
@@ -1,8 +1,15 @@
 import collections
 import contextlib
+import hashlib
 import time
 from math import log
 
+import numpy as np
+
+#: Id arrays spanning up to twice their length plus this many ids are counted
+#: with np.bincount()
+BINCOUNT_MIN_SIZE = 1 << 16
+
 
 def count_all(documents, method='total'):
     """
@@ -26,9 +33,12 @@ def count_all(documents, method='total'):
     """
 
     if method == 'log-doc-freq':
-        counter = count_all('doc-freq')
-        counter.update({tok: -log(f) for tok, f in counter.items()})
-        return counter
+        freqs = count_all(documents, 'doc-freq')
+        return collections.Counter({tok: -log(f) for tok, f in freqs.items()})
+
+    if documents and all(map(is_id_array, documents)) and \
+            np.result_type(*documents).kind in 'iu':
+        return _count_ids(documents, method)
 
     counter = collections.Counter()
     size = len(documents)
@@ -37,29 +47,87 @@ def count_all(documents, method='total'):
             for word in doc:
                 counter[word] += 1
         elif method == 'doc':
-            for word in doc:
-                if word in doc:
-                    counter[word] += 1
+            for word in set(doc):
+                counter[word] += 1
         elif method == 'doc-freq':
-            for word in doc:
-                if word in doc:
-                    counter[word] += 1 / size
+            for word in set(doc):
+                counter[word] += 1 / size
         else:
             raise ValueError('invalid method: %r' % method)
     return counter
 
 
+def _count_ids(documents, method):
+    """
+    Implements count_all() for documents given as arrays of integer ids.
+    """
+
+    if method == 'total':
+        ids = np.concatenate(documents)
+    elif method in ('doc', 'doc-freq'):
+        ids = np.concatenate([np.unique(doc) for doc in documents])
+    else:
+        raise ValueError('invalid method: %r' % method)
+    if not len(ids):
+        return collections.Counter()
+
+    # Vocabulary ids are small and dense and can be counted in an array
+    # indexed by id. Hashes and other sparse ranges are sorted instead.
+    offset = min(int(ids.min()), 0)
+    if ids.dtype != np.uint64 and \
+            int(ids.max()) - offset <= 2 * len(ids) + BINCOUNT_MIN_SIZE:
+        counts = np.bincount(ids - offset)
+        tokens = np.flatnonzero(counts)
+        values = counts[tokens].tolist()
+        tokens = (tokens + offset).tolist()
+    else:
+        tokens, counts = np.unique(ids, return_counts=True)
+        tokens, values = tokens.tolist(), counts.tolist()
+    if method == 'doc-freq':
+        values = [n / len(documents) for n in values]
+    return collections.Counter(dict(zip(tokens, values)))
+
+
+def is_id_array(document):
+    """
+    Return True if document is a NumPy array of integer token ids.
+    """
+
+    return isinstance(document, np.ndarray) and document.dtype.kind in 'iu'
+
+
 def tokens_all(documents):
     """
     Return a list of tokens from all documents.
     """
 
+    if documents and all(map(is_id_array, documents)):
+        return np.unique(np.concatenate(documents)).tolist()
+
     tokens = set()
     for doc in documents:
         tokens.update(doc)
     return sorted(tokens)
 
 
+def stable_hash(token, bits=64):
+    """
+    Return a hash of token that, unlike hash(), does not change between runs
+    or processes.
+
+    Args:
+        token:
+            Any object. Non-string tokens are hashed by their str() value.
+        bits (int):
+            Number of bits of the result (at most 64).
+    """
+
+    if not isinstance(token, bytes):
+        token = str(token).encode('utf8')
+    digest = hashlib.blake2b(token, digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> (64 - bits)
+
+
 class Instant:
     """
     Fake number-like object. Used at timeit() context manager.
@@ -0,0 +1,168 @@
+"""
+Interned vocabulary of tokens.
+
+A Vocabulary assigns a small integer id to each distinct token, so documents
+can be stored as int32 arrays (4 bytes per token) instead of lists of
+strings. Functions such as plagiarism.utils.count_all(),
+plagiarism.utils.tokens_all(), plagiarism.bag_of_words.bag_of_documents() and
+plagiarism.ngrams.optimal_bigrams() accept documents in this representation.
+"""
+
+import numpy as np
+
+__all__ = ['Vocabulary']
+
+ID_DTYPE = np.int32
+
+
+class Vocabulary:
+    """
+    A bidirectional mapping between tokens and int32 ids.
+
+    Args:
+        tokens:
+            Optional initial sequence of tokens. Ids are assigned in order.
+
+    Examples:
+        >>> vocab = Vocabulary()
+        >>> vocab.encode(['to', 'be', 'or', 'not', 'to', 'be'])
+        array([0, 1, 2, 3, 0, 1], dtype=int32)
+        >>> vocab.decode([3, 0])
+        ['not', 'to']
+    """
+
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.index = {}
+        self.update(tokens)
+
+    def __repr__(self):
+        return 'Vocabulary(<%s tokens>)' % len(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.index
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __getitem__(self, idx):
+        return self.tokens[idx]
+
+    @classmethod
+    def from_documents(cls, documents, sort=True):
+        """
+        Create vocabulary with all tokens in the given documents.
+
+        If sort is True, ids follow the sorted order of tokens, so that
+        comparing ids is equivalent to comparing tokens.
+        """
+
+        tokens = set()
+        for doc in documents:
+            tokens.update(doc)
+        return cls(sorted(tokens) if sort else tokens)
+
+    def id(self, token):
+        """
+        Return the id of token, adding it to the vocabulary if necessary.
+        """
+
+        try:
+            return self.index[token]
+        except KeyError:
+            idx = self.index[token] = len(self.tokens)
+            self.tokens.append(token)
+            return idx
+
+    def update(self, tokens):
+        """
+        Add all tokens in the given sequence.
+        """
+
+        for tok in tokens:
+            if tok not in self.index:
+                self.index[tok] = len(self.tokens)
+                self.tokens.append(tok)
+
+    def encode(self, document, add=True):
+        """
+        Convert a sequence of tokens to an int32 array of ids.
+
+        If add is False, unknown tokens raise a KeyError.
+        """
+
+        if add:
+            self.update(document)
+        index = self.index
+        return np.fromiter(map(index.__getitem__, document), dtype=ID_DTYPE,
+                           count=len(document))
+
+    def encode_all(self, documents, add=True):
+        """
+        Encode a list of documents.
+        """
+
+        return [self.encode(doc, add) for doc in documents]
+
+    def decode(self, ids):
+        """
+        Convert a sequence of ids back to a list of tokens.
+        """
+
+        tokens = self.tokens
+        if isinstance(ids, np.ndarray):
+            ids = ids.tolist()
+        return [tokens[i] for i in ids]
+
+    def decode_all(self, documents):
+        """
+        Decode a list of documents.
+        """
+
+        return [self.decode(doc) for doc in documents]
+
+    def join(self, ids, sep=' '):
+        """
+        Return the id of the token obtained by joining the tokens with the
+        given ids.
+
+        This method can be passed as the join argument of
+        plagiarism.ngrams.optimal_bigrams() to merge documents of ids. New
+        tokens are appended, hence their ids do not follow the sorted order
+        of tokens even if the vocabulary was created with sort=True.
+        """
+
+        return self.id(sep.join(map(str, self.decode(ids))))
+
+    def mask(self, tokens):
+        """
+        Return a boolean array with True at the ids of the given tokens.
+
+        Tokens missing from the vocabulary are ignored.
+        """
+
+        mask = np.zeros(len(self.tokens), dtype=bool)
+        ids = [self.index[tok] for tok in tokens if tok in self.index]
+        mask[ids] = True
+        return mask
+
+    def remove_tokens(self, document, mask):
+        """
+        Remove ids in which mask is True from a document of ids. This is
+        typically used to filter out stop words.
+
+        Examples:
+            >>> vocab = Vocabulary(['the', 'cat', 'sat'])
+            >>> stop_words = vocab.mask(['the'])
+            >>> vocab.remove_tokens(vocab.encode(['the', 'cat']), stop_words)
+            array([1], dtype=int32)
+        """
+
+        document = np.asarray(document, dtype=ID_DTYPE)
+        if len(mask) < len(self.tokens):
+            mask = np.concatenate([
+                mask, np.zeros(len(self.tokens) - len(mask), dtype=bool)])
+        return document[~mask[document]]
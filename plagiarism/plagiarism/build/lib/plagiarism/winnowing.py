@@ -0,0 +1,199 @@
+"""
+Winnowing fingerprints for source code (the algorithm used by MOSS).
+
+Each document is converted to a sequence of tokens, k-grams of tokens are
+hashed with a rolling hash and only the minimum hash of each window of
+consecutive k-grams is kept as a fingerprint. Documents sharing fingerprints
+share at least one k-gram, regardless of where it appears.
+"""
+
+import collections
+
+import numpy as np
+from scipy import sparse as sp_sparse
+
+from plagiarism.tokenizers import tokenize_all
+from plagiarism.utils import stable_hash
+
+__all__ = ['kgram_hashes', 'winnow', 'fingerprints', 'FingerprintIndex']
+
+#: Modulus and base of the Karp-Rabin rolling hash
+MODULUS = (1 << 61) - 1
+BASE = 1000003
+
+
+def kgram_hashes(tokens, k=5):
+    """
+    Return a list with the rolling hash of each k-gram of tokens.
+
+    Examples:
+        >>> len(kgram_hashes(['a', 'b', 'c', 'd'], 2))
+        3
+    """
+
+    values = [stable_hash(tok) % MODULUS for tok in tokens]
+    if len(values) < k:
+        return []
+
+    power = pow(BASE, k - 1, MODULUS)
+    h = 0
+    for value in values[:k]:
+        h = (h * BASE + value) % MODULUS
+    result = [h]
+    for old, new in zip(values, values[k:]):
+        h = ((h - old * power) * BASE + new) % MODULUS
+        result.append(h)
+    return result
+
+
+def winnow(hashes, window=4):
+    """
+    Select the fingerprints of a sequence of hashes.
+
+    In each window of consecutive hashes the minimum value is selected. Ties
+    are broken by selecting the rightmost occurrence and a hash is recorded
+    only once while it remains the minimum of successive windows.
+
+    Returns:
+        A list of (hash, position) pairs.
+    """
+
+    if not hashes:
+        return []
+    if len(hashes) <= window:
+        pos = min(range(len(hashes)), key=lambda i: (hashes[i], -i))
+        return [(hashes[pos], pos)]
+
+    result = []
+    queue = collections.deque()  # positions with increasing hash values
+    for i, h in enumerate(hashes):
+        while queue and hashes[queue[-1]] >= h:
+            queue.pop()
+        queue.append(i)
+        if queue[0] <= i - window:
+            queue.popleft()
+        if i >= window - 1:
+            pos = queue[0]
+            if not result or result[-1][1] != pos:
+                result.append((hashes[pos], pos))
+    return result
+
+
+def fingerprints(tokens, k=5, window=4):
+    """
+    Return the list of (hash, position) fingerprints of a tokenized document.
+
+    Args:
+        tokens:
+            Sequence of tokens, e.g., the output of split_programming_tokens().
+        k (int):
+            Size of the k-grams. Matches shorter than k tokens are ignored.
+        window (int):
+            Size of the winnowing window. Any match with at least
+            window + k - 1 tokens is guaranteed to be detected.
+    """
+
+    return winnow(kgram_hashes(tokens, k), window)
+
+
+class FingerprintIndex:
+    """
+    Inverted index mapping fingerprints to the documents that contain them.
+
+    Args:
+        k, window:
+            Parameters passed to fingerprints().
+        tokenizer:
+            Tokenizer used on string documents passed to add().
+
+    Examples:
+        >>> index = FingerprintIndex(k=3, window=2)
+        >>> index.add('a', 'x = y + 1')
+        >>> index.add('b', 'z = y + 1')
+        >>> int(index.shared_counts()[0, 1])
+        1
+    """
+
+    def __init__(self, k=5, window=4, tokenizer='code'):
+        self.k = k
+        self.window = window
+        self.tokenizer = tokenizer
+        self.names = []
+        self.sizes = []
+        self.index = collections.defaultdict(list)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, document):
+        """
+        Register a document. Strings are tokenized first.
+        """
+
+        if isinstance(document, str):
+            document = tokenize_all([document], tokenizer=self.tokenizer)[0]
+        hashes = {h for h, _ in fingerprints(document, self.k, self.window)}
+        idx = len(self.names)
+        self.names.append(name)
+        self.sizes.append(len(hashes))
+        for h in hashes:
+            self.index[h].append(idx)
+
+    def add_all(self, documents):
+        """
+        Register all documents of a mapping of names to documents.
+        """
+
+        for name, document in documents.items():
+            self.add(name, document)
+
+    def shared_counts(self, max_docs=None):
+        """
+        Return a sparse symmetric matrix with the number of fingerprints shared
+        by each pair of documents.
+
+        The matrix is built in a single pass over the inverted index.
+
+        Args:
+            max_docs (int):
+                Fingerprints present in more than max_docs documents (usually
+                boilerplate or template code) are ignored.
+        """
+
+        size = len(self.names)
+        rows = []
+        cols = []
+        for docs in self.index.values():
+            m = len(docs)
+            if m < 2 or (max_docs is not None and m > max_docs):
+                continue
+            docs = np.array(docs)
+            i, j = np.triu_indices(m, k=1)
+            rows.append(docs[i])
+            cols.append(docs[j])
+
+        if rows:
+            rows = np.concatenate(rows)
+            cols = np.concatenate(cols)
+        else:
+            rows = cols = np.zeros(0, dtype=int)
+        values = np.ones(2 * len(rows), dtype=np.int32)
+        matrix = sp_sparse.coo_matrix(
+            (values, (np.concatenate([rows, cols]),
+                      np.concatenate([cols, rows]))),
+            shape=(size, size))
+        return matrix.tocsr()
+
+    def similarity_matrix(self, max_docs=None):
+        """
+        Sparse matrix with the fraction of fingerprints of the smallest
+        document in each pair that are shared with the other document.
+        """
+
+        shared = self.shared_counts(max_docs).tocoo()
+        sizes = np.array(self.sizes, dtype=float)
+        smallest = np.minimum(sizes[shared.row], sizes[shared.col])
+        values = shared.data / np.where(smallest == 0, 1, smallest)
+        size = len(self.names)
+        return sp_sparse.csr_matrix((values, (shared.row, shared.col)),
+                                    shape=(size, size))